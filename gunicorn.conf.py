@@ -0,0 +1,40 @@
+"""
+Gunicorn settings for serving the app in production, read from the environment. Gunicorn loads
+this file from the working directory, so the app is served with just:
+
+    gunicorn src.wsgi:app
+
+Every worker process has its own connection pool (see DB_POOL_SIZE and DB_POOL_MAX_OVERFLOW), so
+GUNICORN_WORKERS * (DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW) must fit within Postgres' max_connections.
+A worker's threads share its pool, so DB_POOL_SIZE should be at least GUNICORN_THREADS.
+
+With GUNICORN_PRELOAD=true the app is created once in the master process and forked into each
+worker. Any connection left in the master's pools by then, such as one opened while setting up
+the app, would be forked along with it, sharing its socket between the master and every worker. pre_fork therefore disposes of the master's engines before each worker is forked.
+Disposing of them in post_fork instead would be too late: closing an inherited connection in the
+worker terminates it for the master and the other workers too.
+"""
+
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+# a fixed default, since a container sees all of its host's CPUs, and sizing by them could open
+# more connections than Postgres allows; two workers use at most 30 with the default pool settings
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+# more than one thread makes gunicorn use its threaded (gthread) workers
+threads = int(os.getenv("GUNICORN_THREADS", "1"))
+# only threaded workers keep connections alive between requests
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# workers are restarted after a (jittered, so that they don't all restart at once) number of
+# requests, which bounds the memory lost to leaks or fragmentation
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "100"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "false").lower() == "true"
+
+
+def pre_fork(server, worker):
+    # pylint: disable=unused-argument
+    if preload_app:
+        from src.wsgi import dispose_engines  # pylint: disable=import-outside-toplevel
+
+        dispose_engines()
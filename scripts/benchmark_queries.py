@@ -0,0 +1,57 @@
+"""
+Compares the hot primary key and username lookups built and compiled on every call, as controllers
+used to make them, with their baked equivalents (see src/utils/baked_queries.py), along with the
+cost of just building and compiling the unbaked queries. Runs against the database configured by
+the environment, e.g.
+
+    docker exec marathon-api python -m scripts.benchmark_queries 5000
+"""
+
+import sys
+import timeit
+import uuid
+
+from src.app import create_app
+from src.db import DB
+from src.models import Team, User
+from src.utils.baked_queries import find_active
+
+
+def main(iterations):
+    app = create_app()
+    with app.app_context():
+        team_id = str(uuid.uuid4())
+        username = "benchmark"
+        dialect = DB.engine.dialect
+        cases = [
+            (
+                "team by id",
+                lambda: Team.query.filter_by(id=team_id, is_active=True),
+                lambda: find_active(Team, id=team_id),
+            ),
+            (
+                "user by username",
+                lambda: User.query.filter_by(username=username, is_active=True),
+                lambda: find_active(User, username=username),
+            ),
+        ]
+        print(f"{'lookup':<20}{'compile only':>16}{'unbaked':>16}{'baked':>16}")
+        for name, build_query, baked_lookup in cases:
+            timings = [
+                _time(
+                    lambda: build_query().statement.compile(dialect=dialect), iterations
+                ),
+                _time(lambda: build_query().first(), iterations),
+                _time(baked_lookup, iterations),
+            ]
+            print(f"{name:<20}" + "".join(f"{t * 1e6:>13.1f} µs" for t in timings))
+            DB.session.rollback()
+
+
+def _time(func, iterations):
+    func()
+    return timeit.timeit(func, number=iterations) / iterations
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
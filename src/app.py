@@ -1,21 +1,30 @@
 import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from operator import itemgetter
 
-from flask import Flask
+from flask import Flask, request
 from flask_jwt_extended import JWTManager
-from flask_migrate import Migrate, upgrade
+from flask_migrate import Migrate
 from flask_restful import Api
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import NullPool
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 from .controllers import (
     Auth,
+    AuthRefresh,
     TeamDetail,
     TeamList,
+    UserAvailability,
     UserList,
     UserDetail,
     UserRelationshipTeams,
     UserTeams,
 )
 from .db import DB
+from .models import Team, TeamMembership, User
 from .exceptions import (
     make_error_response,
     BadRequestError,
@@ -26,36 +35,99 @@ from .exceptions import (
     UnprocessableEntityError,
     NotAcceptableError,
     UnsupportedMediaTypeError,
+    TooManyRequestsError,
+    ServiceUnavailableError,
+    GatewayTimeoutError,
 )
+from .utils.cache import create_cache
+from .utils.current_user import load_user_facts
+from .utils.invalidation import InvalidationListener
+from .utils.metered_pool import MeteredQueuePool
+from .utils.metrics import Metrics
+from .utils.password_hasher import PasswordHasher
+from .utils.purge import purge
+from .utils.query_budgets import parse_budget, to_api_error
+from .utils.read_replicas import choose_replica, stick_to_primary
+from .utils.rate_limiter import BACKENDS, RateLimiter, parse_limit
+from .utils.url_converters import InvalidPathParameter, ResourceIDConverter
 
 
 def setup_db(app, db_params):
     user, password, host, port, name = itemgetter(
         "user", "password", "host", "port", "name"
     )(db_params)
+    replica_hosts = os.getenv("DB_REPLICA_HOSTS", "")
+    direct_host, direct_port = os.getenv("DB_DIRECT_HOST"), os.getenv("DB_DIRECT_PORT")
     app.config[
         "SQLALCHEMY_DATABASE_URI"
     ] = f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{name}"
+    # when connecting through PgBouncer, migrations and LISTENing need a direct connection
+    app.config["SQLALCHEMY_DIRECT_DATABASE_URI"] = (
+        f"postgresql+psycopg2://{user}:{password}@"
+        f"{direct_host or host}:{direct_port or port}/{name}"
+    )
+    app.config["DB_PGBOUNCER"] = os.getenv("DB_PGBOUNCER", "false") == "true"
+    # replicas are given as comma separated hosts, with the primary's port unless they specify one
+    replica_addresses = [
+        address if ":" in address else f"{address}:{port}"
+        for address in filter(None, map(str.strip, replica_hosts.split(",")))
+    ]
+    app.config["SQLALCHEMY_BINDS"] = {
+        f"replica_{i}": f"postgresql+psycopg2://{user}:{password}@{address}/{name}"
+        for i, address in enumerate(replica_addresses)
+    }
+    app.config["READ_REPLICA_BINDS"] = sorted(app.config["SQLALCHEMY_BINDS"])
+    app.config["READ_REPLICA_STICKY_SECONDS"] = int(
+        os.getenv("READ_REPLICA_STICKY_SECONDS", "5")
+    )
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     app.config["SQLALCHEMY_ECHO"] = False
+    if app.config["DB_PGBOUNCER"]:
+        # PgBouncer pools the server connections, so holding on to connections to it would only
+        # tie up its client slots
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = dict(poolclass=NullPool)
+    else:
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = dict(
+            poolclass=MeteredQueuePool,
+            pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+            max_overflow=int(os.getenv("DB_POOL_MAX_OVERFLOW", "10")),
+            pool_timeout=int(os.getenv("DB_POOL_TIMEOUT", "30")),
+            pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+            pool_pre_ping=os.getenv("DB_POOL_PRE_PING", "true") == "true",
+        )
     DB.init_app(app)
+    app.before_request(choose_replica)
+    app.after_request(stick_to_primary)
 
 
 def setup_api(app):
+    app.url_map.converters["resource_id"] = ResourceIDConverter
     api = Api(app)
     api.add_resource(Auth, "/auth")
+    api.add_resource(AuthRefresh, "/auth/refresh")
     api.add_resource(TeamList, "/teams")
-    api.add_resource(TeamDetail, "/teams/<team_id>")
+    api.add_resource(TeamDetail, '/teams/<resource_id("Team"):team_id>')
     api.add_resource(UserList, "/users")
-    api.add_resource(UserDetail, "/users/<user_id>")
-    api.add_resource(UserRelationshipTeams, "/users/<user_id>/relationships/teams")
-    api.add_resource(UserTeams, "/users/<user_id>/teams")
+    api.add_resource(UserAvailability, "/users/availability")
+    api.add_resource(UserDetail, '/users/<resource_id("User"):user_id>')
+    api.add_resource(
+        UserRelationshipTeams,
+        '/users/<resource_id("User"):user_id>/relationships/teams',
+    )
+    api.add_resource(UserTeams, '/users/<resource_id("User"):user_id>/teams')
 
 
 def setup_jwt(app):
     # pylint: disable=unused-variable
     app.config["JWT_SECRET_KEY"] = os.getenv("SECRET_KEY")
+    app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(
+        seconds=int(os.getenv("JWT_ACCESS_TOKEN_EXPIRES", "900"))
+    )
+    app.config["JWT_REFRESH_TOKEN_EXPIRES"] = timedelta(
+        seconds=int(os.getenv("JWT_REFRESH_TOKEN_EXPIRES", "2592000"))
+    )
     jwt = JWTManager(app)
+    jwt.user_loader_callback_loader(load_user_facts)
 
     @jwt.unauthorized_loader
     def unauthorized(reason):
@@ -65,10 +137,26 @@ def setup_jwt(app):
     def invalid_token(reason):
         return make_error_response(UnprocessableEntityError(reason))
 
+    @jwt.expired_token_loader
+    def expired_token(token):
+        return make_error_response(
+            UnauthorizedError(f"The {token['type']} token has expired")
+        )
+
+
+def setup_query_budgets(app):
+    app.config["QUERY_BUDGETS"] = dict(
+        detail=parse_budget(os.getenv("QUERY_BUDGET_DETAIL", "2000/10000")),
+        collection=parse_budget(os.getenv("QUERY_BUDGET_COLLECTION", "10000/10000")),
+        write=parse_budget(os.getenv("QUERY_BUDGET_WRITE", "5000/10000")),
+    )
+
 
 def setup_error_handling(app):
     # pylint: disable=unused-variable
-    app.config["BUNDLE_ERRORS"] = True
+    # flask-restful turns any exception raised by a resource into a bare 500 response unless
+    # exceptions propagate, which Flask only does by default in debug and testing mode
+    app.config["PROPAGATE_EXCEPTIONS"] = True
 
     @app.errorhandler(BadRequestError)
     @app.errorhandler(ConflictError)
@@ -77,15 +165,202 @@ def setup_error_handling(app):
     @app.errorhandler(UnauthorizedError)
     @app.errorhandler(NotAcceptableError)
     @app.errorhandler(UnsupportedMediaTypeError)
+    @app.errorhandler(TooManyRequestsError)
+    @app.errorhandler(ServiceUnavailableError)
+    @app.errorhandler(GatewayTimeoutError)
     def handle_error(error):
         return make_error_response(error)
 
+    @app.errorhandler(OperationalError)
+    def handle_operational_error(error):
+        DB.session.rollback()
+        api_error = to_api_error(error)
+        if api_error is None:
+            raise error
+        return make_error_response(api_error)
+
+    @app.errorhandler(InvalidPathParameter)
+    def handle_invalid_path_parameter(error):
+        return make_error_response(error.error)
+
+
+def setup_password_hashing(app):
+    app.config["BCRYPT_ROUNDS"] = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    app.config["BCRYPT_MAX_WORKERS"] = int(
+        os.getenv("BCRYPT_MAX_WORKERS", str(os.cpu_count() or 1))
+    )
+    app.config["BCRYPT_MAX_PENDING"] = int(os.getenv("BCRYPT_MAX_PENDING", "16"))
+    app.extensions["password_hasher"] = PasswordHasher(
+        app.config["BCRYPT_ROUNDS"],
+        app.config["BCRYPT_MAX_WORKERS"],
+        app.config["BCRYPT_MAX_PENDING"],
+    )
+
+
+def setup_proxies(app):
+    # behind reverse proxies every request comes from the nearest one, so rate limits would be
+    # shared by all clients; the trusted proxies' X-Forwarded-* headers give the client's address
+    # instead. Only as many proxies as are configured are trusted, since any further values of the
+    # headers could have been sent by the client itself
+    app.config["TRUSTED_PROXY_COUNT"] = int(os.getenv("TRUSTED_PROXY_COUNT", "0"))
+    if app.config["TRUSTED_PROXY_COUNT"] > 0:
+        proxies = app.config["TRUSTED_PROXY_COUNT"]
+        app.wsgi_app = ProxyFix(
+            app.wsgi_app, x_for=proxies, x_proto=proxies, x_host=proxies
+        )
+
+
+def setup_rate_limiting(app):
+    # pylint: disable=unused-variable
+    app.config["RATE_LIMIT_BACKEND"] = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    app.config["RATE_LIMITS"] = dict(
+        availability=parse_limit(os.getenv("RATE_LIMIT_AVAILABILITY", "30/60")),
+        login_ip=parse_limit(os.getenv("RATE_LIMIT_LOGIN_IP", "20/60")),
+        login_username=parse_limit(os.getenv("RATE_LIMIT_LOGIN_USERNAME", "5/60")),
+    )
+    app.extensions["rate_limiter"] = RateLimiter(
+        BACKENDS[app.config["RATE_LIMIT_BACKEND"]](), app.config["RATE_LIMITS"]
+    )
+
+    @app.cli.command("prune-rate-limits")
+    def prune_rate_limits():
+        """Discards rate limit buckets which have refilled completely."""
+        app.extensions["rate_limiter"].prune()
+
+
+def setup_purging(app):
+    # pylint: disable=unused-variable
+    app.config["PURGE_IN_BACKGROUND_THRESHOLD"] = int(
+        os.getenv("PURGE_IN_BACKGROUND_THRESHOLD", "1000")
+    )
+    app.config["PURGE_CHUNK_SIZE"] = int(os.getenv("PURGE_CHUNK_SIZE", "500"))
+    app.extensions["purge_executor"] = ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix="purge"
+    )
+
+    @app.cli.command("purge-inactive")
+    def purge_inactive():
+        """Purges users and teams left inactive by an interrupted background purge."""
+        for model, membership_column in (
+            (User, TeamMembership.user_id),
+            (Team, TeamMembership.team_id),
+        ):
+            inactive = DB.session.query(model.id).filter_by(is_active=False).all()
+            for (resource_id,) in inactive:
+                purge(
+                    model,
+                    resource_id,
+                    membership_column,
+                    app.config["PURGE_CHUNK_SIZE"],
+                )
+
+
+def setup_caching(app):
+    app.config["CACHE_BACKEND"] = os.getenv("CACHE_BACKEND", "memory")
+    app.config["CACHE_URL"] = os.getenv("CACHE_URL")
+    app.config["USER_CACHE_TTL"] = int(os.getenv("USER_CACHE_TTL", "60"))
+    app.config["USER_CACHE_MAX_ENTRIES"] = int(
+        os.getenv("USER_CACHE_MAX_ENTRIES", "10000")
+    )
+    app.config["RESPONSE_CACHE_MAX_BYTES"] = int(
+        os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+    )
+    app.config["FRAGMENT_CACHE_MAX_BYTES"] = int(
+        os.getenv("FRAGMENT_CACHE_MAX_BYTES", str(32 * 1024 * 1024))
+    )
+    app.config["MISSING_RESOURCES_CACHE_TTL"] = int(
+        os.getenv("MISSING_RESOURCES_CACHE_TTL", "30")
+    )
+    app.config["MISSING_RESOURCES_CACHE_MAX_ENTRIES"] = int(
+        os.getenv("MISSING_RESOURCES_CACHE_MAX_ENTRIES", "10000")
+    )
+    app.extensions["user_facts_cache"] = create_cache(
+        app,
+        "user_facts",
+        max_entries=app.config["USER_CACHE_MAX_ENTRIES"],
+        ttl=app.config["USER_CACHE_TTL"],
+    )
+    app.extensions["response_cache"] = create_cache(
+        app, "responses", max_bytes=app.config["RESPONSE_CACHE_MAX_BYTES"]
+    )
+    app.extensions["fragment_cache"] = create_cache(
+        app, "fragments", max_bytes=app.config["FRAGMENT_CACHE_MAX_BYTES"]
+    )
+    app.extensions["missing_resources_cache"] = create_cache(
+        app,
+        "missing_resources",
+        max_entries=app.config["MISSING_RESOURCES_CACHE_MAX_ENTRIES"],
+        ttl=app.config["MISSING_RESOURCES_CACHE_TTL"],
+    )
+
+
+def setup_cache_invalidation(app):
+    # pylint: disable=unused-variable
+    app.config["CACHE_INVALIDATION_CHANNEL"] = os.getenv(
+        "CACHE_INVALIDATION_CHANNEL", "cache_invalidation"
+    )
+    app.config["CACHE_INVALIDATION_LISTENER"] = (
+        os.getenv("CACHE_INVALIDATION_LISTENER", "true") == "true"
+    )
+    app.extensions["invalidation_origin"] = uuid.uuid4().hex
+    app.extensions["invalidation_listener"] = InvalidationListener(app)
+
+    # the listener is started lazily so that, when the app is loaded before forking worker
+    # processes, each worker starts its own
+    @app.before_first_request
+    def start_invalidation_listener():
+        if app.config["CACHE_INVALIDATION_LISTENER"]:
+            app.extensions["invalidation_listener"].start()
+
+
+def setup_metrics(app):
+    # pylint: disable=unused-variable
+    metrics = app.extensions["metrics"] = Metrics()
+    cache_names = (
+        "user_facts_cache",
+        "response_cache",
+        "fragment_cache",
+        "missing_resources_cache",
+    )
+
+    def collect_cache_stats():
+        for cache_name in cache_names:
+            stats = app.extensions[cache_name].stats()
+            for stat in ("hits", "misses", "evictions"):
+                yield f"cache_{stat}_total", dict(cache=cache_name), stats[stat]
+
+    def collect_pool_stats():
+        for bind in [None, *app.config["READ_REPLICA_BINDS"]]:
+            pool = DB.get_engine(app, bind=bind).pool
+            if not isinstance(pool, MeteredQueuePool):
+                continue
+            stats = pool.stats()
+            labels = dict(bind=bind or "primary")
+            yield "db_pool_checkouts_total", labels, stats["checkouts"]
+            yield "db_pool_checkout_wait_seconds_total", labels, stats[
+                "checkout_seconds"
+            ]
+            yield "db_pool_checkout_timeouts_total", labels, stats["checkout_timeouts"]
+            yield "db_pool_size", labels, stats["size"]
+            yield "db_pool_checked_out", labels, stats["checked_out"]
+            yield "db_pool_overflow", labels, stats["overflow"]
+
+    metrics.add_collector(collect_cache_stats)
+    metrics.add_collector(collect_pool_stats)
+
+    @app.route("/metrics")
+    def render_metrics():
+        return app.response_class(
+            metrics.render(), mimetype="text/plain; version=0.0.4"
+        )
+
 
 def setup_response_headers(app):
     # pylint: disable=unused-variable
     @app.after_request
     def add_content_type(resp):
-        resp.headers["Content-Type"] = "application/vnd.api+json"
+        if request.endpoint != "render_metrics":
+            resp.headers["Content-Type"] = "application/vnd.api+json"
         return resp
 
 
@@ -105,11 +380,18 @@ def create_app(
     )
     setup_api(app)
     setup_jwt(app)
+    setup_query_budgets(app)
     setup_error_handling(app)
+    setup_password_hashing(app)
+    setup_proxies(app)
+    setup_rate_limiting(app)
+    setup_purging(app)
+    setup_caching(app)
+    setup_cache_invalidation(app)
+    setup_metrics(app)
     setup_response_headers(app)
+    # migrations are run once per deployment (with `flask db upgrade`) rather than by every app
     Migrate(app, DB)
-    with app.app_context():
-        upgrade()
     return app
 
 
@@ -1,6 +1,8 @@
 from .auth import Auth
+from .auth_refresh import AuthRefresh
 from .team_detail import TeamDetail
 from .team_list import TeamList
+from .user_availability import UserAvailability
 from .user_detail import UserDetail
 from .user_list import UserList
 from .user_relationship_teams import UserRelationshipTeams
@@ -1,25 +1,39 @@
-from flask_restful import Resource, reqparse
-from flask_jwt_extended import create_access_token
+from flask_restful import Resource
+from flask_jwt_extended import create_access_token, create_refresh_token
 
+from ..db import DB
 from ..exceptions import BadRequestError
 from ..models import User
+from ..utils.baked_queries import find_active
+from ..utils.pipeline import pipeline
+from ..utils.rate_limiter import client_ip, submitted_username
+from ..utils.invalidation import mark_stale
+from ..utils.request_schema import Field, RequestSchema
 
 
-def make_parser():
-    parser = reqparse.RequestParser()
-    for key in ("username", "password"):
-        parser.add_argument(name=key, required=True, nullable=False, location="form")
-    return parser
+CREDENTIALS_SCHEMA = RequestSchema(
+    "form", username=Field(required=True), password=Field(required=True)
+)
 
 
 class Auth(Resource):
-    def __init__(self):
-        super().__init__()
-        self.parser = make_parser()
-
+    @pipeline(
+        budget="write",
+        rate_limits=[("login_ip", client_ip), ("login_username", submitted_username)],
+    )
     def post(self):
-        args = self.parser.parse_args()
-        user = User.query.filter_by(username=args["username"]).first()
+        args = CREDENTIALS_SCHEMA.parse()
+        user = find_active(User, username=args["username"])
         if user and user.has_password(args["password"]):
-            return dict(data=dict(access_token=create_access_token(identity=user.id)))
+            if user.password_needs_rehash():
+                user.password = args["password"]
+                mark_stale("users", user.id)
+                DB.session.add(user)
+                DB.session.commit()
+            return dict(
+                data=dict(
+                    access_token=create_access_token(identity=user.id),
+                    refresh_token=create_refresh_token(identity=user.id),
+                )
+            )
         raise BadRequestError("Invalid credentials")
@@ -0,0 +1,18 @@
+from flask import g
+from flask_restful import Resource
+from flask_jwt_extended import create_access_token
+
+from ..exceptions import UnauthorizedError
+from ..utils.pipeline import pipeline
+
+
+class AuthRefresh(Resource):
+    @pipeline(budget="write", auth="refresh")
+    def post(self):
+        # pylint: disable=no-self-use
+        current_user = g.current_user
+        if not (current_user.exists and current_user.is_active):
+            raise UnauthorizedError(f"User {current_user.id} no longer exists")
+        return dict(
+            data=dict(access_token=create_access_token(identity=current_user.id))
+        )
@@ -1,47 +1,50 @@
-from flask_restful import Resource, reqparse
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import g
+from flask_restful import Resource
 
 from ..db import DB
-from ..exceptions import BadRequestError, ForbiddenError
+from ..exceptions import ForbiddenError
 from ..models import Team, TeamMembership, User
-from ..utils.is_valid_uuid import is_valid_uuid
-from ..utils.controller_decorators import call_before, get_resource, format_response
+from ..utils.pipeline import pipeline
+from ..utils.fingerprints import get_detail_fingerprint
+from ..utils.purge import delete_resource
+from ..utils.invalidation import mark_stale
 from ..utils.controller_validators import (
     validate_accept_header,
     validate_content_type_header,
 )
-
-
-def validate_uuid(*args, team_id):
-    if not is_valid_uuid(team_id):
-        raise BadRequestError(f"Team ID {team_id} is not a valid UUID")
+from ..utils.request_schema import Field, RequestSchema
 
 
 def validate_permissions(*args, team):
-    current_user_id = get_jwt_identity()
-    current_user = User.query.filter_by(id=current_user_id).first()
-    if (not current_user) or (current_user not in team.members):
+    current_user = g.current_user
+    if not (
+        current_user.exists
+        and current_user.is_active
+        and any(member.id == current_user.id for member in team.members)
+    ):
         raise ForbiddenError(
-            f"User {current_user_id} cannot modify team {team.id} because they are not a member"
+            f"User {current_user.id} cannot modify team {team.id} because they are not a member"
         )
 
 
-def make_parser():
-    parser = reqparse.RequestParser()
-    parser.add_argument(name="name", nullable=False, location="json")
-    return parser
+def get_fingerprint(*args, team_id):
+    return get_detail_fingerprint(
+        Team, team_id, TeamMembership.team_id, User, TeamMembership.user_id
+    )
 
 
-class TeamDetail(Resource):
-    def __init__(self):
-        super().__init__()
-        self.parser = make_parser()
+TEAM_SCHEMA = RequestSchema("json", name=Field())
 
-    @jwt_required
-    @call_before([validate_accept_header, validate_uuid])
-    @get_resource(Team)
-    @format_response(
-        {
+
+class TeamDetail(Resource):
+    @pipeline(
+        budget="detail",
+        validate=[validate_accept_header],
+        auth="access",
+        load=Team,
+        fingerprint=get_fingerprint,
+        cache=True,
+        serialize={
             "name": "teams",
             "marshaller": Team.marshaller.omit("id"),
             "relationships": [
@@ -55,34 +58,40 @@ class TeamDetail(Resource):
                     "marshaller": User.marshaller.omit("id"),
                 },
             ],
-        }
+        },
     )
     def get(self, team):
         # pylint: disable=no-self-use
         return team
 
-    @jwt_required
-    @call_before([validate_accept_header, validate_content_type_header, validate_uuid])
-    @get_resource(Team)
-    @call_before([validate_permissions])
-    @format_response(
-        {"name": "teams", "marshaller": Team.marshaller.omit("id"),}
+    @pipeline(
+        budget="write",
+        validate=[validate_accept_header, validate_content_type_header],
+        auth="access",
+        load=Team,
+        authorize_resource=[validate_permissions],
+        serialize={"name": "teams", "marshaller": Team.marshaller.omit("id"),},
     )
     def patch(self, team):
-        args = self.parser.parse_args()
-        for key, value in args.items():
-            if value is not None:
-                setattr(team, key, value)
+        args = TEAM_SCHEMA.parse()
+        if not team.update(**args):
+            return team
+        mark_stale("teams", team.id)
+        mark_stale("users", *(member.id for member in team.members))
         DB.session.add(team)
         DB.session.commit()
         return team
 
-    @jwt_required
-    @call_before([validate_accept_header, validate_uuid])
-    @get_resource(Team)
-    @call_before([validate_permissions])
+    @pipeline(
+        budget="write",
+        validate=[validate_accept_header],
+        auth="access",
+        load=Team,
+        authorize_resource=[validate_permissions],
+    )
     def delete(self, team):
         # pylint: disable=no-self-use
-        DB.session.delete(team)
-        DB.session.commit()
+        mark_stale("teams", team.id)
+        mark_stale("users", *(member.id for member in team.members))
+        delete_resource(team, TeamMembership.team_id)
         return None, 204
@@ -1,38 +1,36 @@
-from flask_restful import Resource, reqparse
-from flask_jwt_extended import jwt_required
+from flask_restful import Resource
+from sqlalchemy.orm.attributes import set_committed_value
 
 from ..db import DB
 from ..exceptions import BadRequestError
 from ..models import Team, TeamMembership, User
-from ..utils.controller_decorators import call_before, format_response
+from ..utils.baked_queries import find_active
+from ..utils.pipeline import pipeline
 from ..utils.controller_validators import (
     validate_accept_header,
     validate_content_type_header,
 )
+from ..utils.fingerprints import get_collection_fingerprint
+from ..utils.invalidation import mark_stale
+from ..utils.request_schema import Field, RequestSchema
 
 
-def make_parser():
-    parser = reqparse.RequestParser()
-    parser.add_argument(name="name", required=True, nullable=False, location="json")
-    parser.add_argument(
-        name="team_members",
-        required=True,
-        nullable=False,
-        location="json",
-        action="append",
-    )
-    return parser
+def get_fingerprint(*args, **kwargs):
+    return get_collection_fingerprint()
 
 
-class TeamList(Resource):
-    def __init__(self):
-        super().__init__()
-        self.parser = make_parser()
+TEAM_SCHEMA = RequestSchema(
+    "json", name=Field(required=True), team_members=Field(required=True, many=True)
+)
+
 
-    @jwt_required
-    @call_before([validate_accept_header])
-    @format_response(
-        {
+class TeamList(Resource):
+    @pipeline(
+        budget="collection",
+        validate=[validate_accept_header],
+        auth="access",
+        fingerprint=get_fingerprint,
+        serialize={
             "name": "teams",
             "marshaller": Team.marshaller.omit("id"),
             "relationships": [
@@ -46,16 +44,17 @@ class TeamList(Resource):
                     "marshaller": User.marshaller.pick("username"),
                 },
             ],
-        }
+        },
     )
     def get(self):
         # pylint: disable=no-self-use
-        return Team.query.all()
+        return Team.query.filter_by(is_active=True).all()
 
-    @jwt_required
-    @call_before([validate_accept_header, validate_content_type_header])
-    @format_response(
-        {
+    @pipeline(
+        budget="write",
+        validate=[validate_accept_header, validate_content_type_header],
+        auth="access",
+        serialize={
             "name": "teams",
             "marshaller": Team.marshaller.omit("id"),
             "relationships": [
@@ -69,16 +68,27 @@ class TeamList(Resource):
                     "marshaller": User.marshaller.pick("username"),
                 },
             ],
-        }
+        },
     )
     def post(self):
-        args = self.parser.parse_args()
-        team = Team(name=args.get("name"))
+        args = TEAM_SCHEMA.parse()
+        members = []
         for user_id in args.get("team_members"):
-            user = User.query.filter_by(id=user_id).first()
+            user = find_active(User, id=user_id)
             if not user:
                 raise BadRequestError(f"User with id {user_id} does not exist")
-            team.members.append(user)
+            members.append(user)
+        team = Team(name=args.get("name"))
         DB.session.add(team)
+        DB.session.flush()
+        memberships = [
+            TeamMembership(user_id=member.id, team_id=team.id) for member in members
+        ]
+        DB.session.add_all(memberships)
+        # the new team's relationships are already known, so needn't be loaded to serialize it
+        set_committed_value(team, "members", members)
+        set_committed_value(team, "team_memberships", memberships)
+        mark_stale("teams", team.id)
+        mark_stale("users", *(member.id for member in members))
         DB.session.commit()
         return team, 201
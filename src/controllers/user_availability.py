@@ -0,0 +1,35 @@
+from flask import request
+from flask_restful import Resource
+
+from ..exceptions import BadRequestError
+from ..models import User
+from ..utils.pipeline import pipeline
+from ..utils.controller_validators import validate_accept_header
+from ..utils.rate_limiter import client_ip
+from ..utils.request_schema import Field, RequestSchema
+
+
+AVAILABILITY_SCHEMA = RequestSchema("args", username=Field(), email=Field())
+
+
+class UserAvailability(Resource):
+    @pipeline(
+        budget="detail",
+        validate=[validate_accept_header],
+        rate_limits=[("availability", client_ip)],
+    )
+    def get(self):
+        args = {
+            key: value
+            for key, value in AVAILABILITY_SCHEMA.parse().items()
+            if value is not None
+        }
+        if not args:
+            raise BadRequestError(
+                "At least one of the query parameters 'username' or 'email' must be provided"
+            )
+        taken = User.find_taken(**args)
+        return {
+            "links": {"self": request.url},
+            "meta": {"available": {key: key not in taken for key in args}},
+        }
@@ -1,20 +1,18 @@
-from flask_restful import Resource, reqparse
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_restful import Resource
+from flask_jwt_extended import get_jwt_identity
 
 from ..db import DB
-from ..exceptions import BadRequestError, ForbiddenError
+from ..exceptions import ForbiddenError
 from ..models import Team, TeamMembership, User
-from ..utils.is_valid_uuid import is_valid_uuid
-from ..utils.controller_decorators import call_before, get_resource, format_response
+from ..utils.pipeline import pipeline
+from ..utils.fingerprints import get_detail_fingerprint
+from ..utils.purge import delete_resource
+from ..utils.invalidation import mark_stale
 from ..utils.controller_validators import (
     validate_accept_header,
     validate_content_type_header,
 )
-
-
-def validate_uuid(*args, user_id):
-    if not is_valid_uuid(user_id):
-        raise BadRequestError(f"User ID {user_id} is not a valid UUID")
+from ..utils.request_schema import Field, RequestSchema
 
 
 def validate_permissions(*args, user_id):
@@ -25,23 +23,30 @@ def validate_permissions(*args, user_id):
         )
 
 
-def make_parser():
-    parser = reqparse.RequestParser()
-    for key in ("first_name", "last_name", "username", "email", "password"):
-        parser.add_argument(name=key, nullable=False, location="json")
-    return parser
+def get_fingerprint(*args, user_id):
+    return get_detail_fingerprint(
+        User, user_id, TeamMembership.user_id, Team, TeamMembership.team_id
+    )
 
 
-class UserDetail(Resource):
-    def __init__(self):
-        super().__init__()
-        self.parser = make_parser()
+USER_SCHEMA = RequestSchema(
+    "json",
+    **{
+        key: Field()
+        for key in ("first_name", "last_name", "username", "email", "password")
+    },
+)
 
-    @jwt_required
-    @call_before([validate_accept_header, validate_uuid])
-    @get_resource(User)
-    @format_response(
-        {
+
+class UserDetail(Resource):
+    @pipeline(
+        budget="detail",
+        validate=[validate_accept_header],
+        auth="access",
+        load=User,
+        fingerprint=get_fingerprint,
+        cache=True,
+        serialize={
             "name": "users",
             "marshaller": User.marshaller.omit("id"),
             "relationships": [
@@ -51,39 +56,42 @@ class UserDetail(Resource):
                 },
                 {"name": "teams", "marshaller": Team.marshaller.omit("id"),},
             ],
-        }
+        },
     )
     def get(self, user):
         # pylint: disable=no-self-use
         return user
 
-    @jwt_required
-    @call_before(
-        [
-            validate_accept_header,
-            validate_content_type_header,
-            validate_uuid,
-            validate_permissions,
-        ]
-    )
-    @get_resource(User)
-    @format_response(
-        {"name": "users", "marshaller": User.marshaller.omit("id"),}
+    @pipeline(
+        budget="write",
+        validate=[validate_accept_header, validate_content_type_header],
+        auth="access",
+        authorize=[validate_permissions],
+        load=User,
+        serialize={"name": "users", "marshaller": User.marshaller.omit("id"),},
     )
     def patch(self, user):
-        args = self.parser.parse_args()
-        for key, value in args.items():
-            if value is not None:
-                setattr(user, key, value)
+        args = USER_SCHEMA.parse()
+        if not user.update(**args):
+            return user
+        mark_stale("users", user.id)
+        mark_stale("teams", *(team.id for team in user.teams))
         DB.session.add(user)
         DB.session.commit()
         return user
 
-    @jwt_required
-    @call_before([validate_accept_header, validate_uuid, validate_permissions])
-    @get_resource(User)
+    @pipeline(
+        budget="write",
+        validate=[validate_accept_header],
+        auth="access",
+        authorize=[validate_permissions],
+        load=User,
+    )
     def delete(self, user):
         # pylint: disable=no-self-use
-        DB.session.delete(user)
-        DB.session.commit()
+        mark_stale("users", user.id)
+        mark_stale("teams", *(team.id for team in user.teams))
+        # the teams and memberships they created or last updated are marked stale by
+        # delete_resource, which nulls their references to the user
+        delete_resource(user, TeamMembership.user_id)
         return None, 204
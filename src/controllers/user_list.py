@@ -1,24 +1,32 @@
 import re
 
-from flask_restful import Resource, reqparse
-from flask_jwt_extended import jwt_required
+from flask_restful import Resource
 from sqlalchemy.exc import IntegrityError
 
 from ..db import DB
 from ..exceptions import ConflictError
 from ..models import Team, TeamMembership, User
-from ..utils.controller_decorators import format_response, call_before
+from ..utils.pipeline import pipeline
 from ..utils.controller_validators import (
     validate_accept_header,
     validate_content_type_header,
 )
+from ..utils.fingerprints import get_collection_fingerprint
+from ..utils.invalidation import mark_stale
+from ..utils.request_schema import Field, RequestSchema
 
 
-def make_parser():
-    parser = reqparse.RequestParser()
-    for arg in ("first_name", "last_name", "username", "email", "password"):
-        parser.add_argument(name=arg, required=True, nullable=False, location="json")
-    return parser
+USER_SCHEMA = RequestSchema(
+    "json",
+    **{
+        key: Field(required=True)
+        for key in ("first_name", "last_name", "username", "email", "password")
+    },
+)
+
+
+def get_fingerprint(*args, **kwargs):
+    return get_collection_fingerprint()
 
 
 def find_duplicated_field(error):
@@ -41,14 +49,12 @@ def check_for_conflict(error, args):
 
 
 class UserList(Resource):
-    def __init__(self):
-        super().__init__()
-        self.parser = make_parser()
-
-    @jwt_required
-    @call_before([validate_accept_header])
-    @format_response(
-        {
+    @pipeline(
+        budget="collection",
+        validate=[validate_accept_header],
+        auth="access",
+        fingerprint=get_fingerprint,
+        serialize={
             "name": "users",
             "marshaller": User.marshaller.omit("id"),
             "relationships": [
@@ -58,19 +64,27 @@ class UserList(Resource):
                 },
                 {"name": "teams", "marshaller": Team.marshaller.pick("name"),},
             ],
-        }
+        },
     )
     def get(self):
         # pylint: disable=no-self-use
-        return User.query.all()
+        return User.query.filter_by(is_active=True).all()
 
-    @call_before([validate_accept_header, validate_content_type_header])
-    @format_response({"name": "users", "marshaller": User.marshaller.omit("id")})
+    @pipeline(
+        budget="write",
+        validate=[validate_accept_header, validate_content_type_header],
+        serialize={"name": "users", "marshaller": User.marshaller.omit("id")},
+    )
     def post(self):
-        args = self.parser.parse_args()
+        args = USER_SCHEMA.parse()
+        taken = User.find_taken(**args)
+        if taken:
+            raise ConflictError(f"User with {taken[0]} {args[taken[0]]} already exists")
         user = User(**args)
         DB.session.add(user)
         try:
+            DB.session.flush()
+            mark_stale("users", user.id)
             DB.session.commit()
         except IntegrityError as error:
             DB.session.rollback()
@@ -1,21 +1,18 @@
 from flask import request
-from flask_jwt_extended import get_jwt_identity, jwt_required
+from flask_jwt_extended import get_jwt_identity
 from flask_restful import Resource
 
 from ..db import DB
 from ..exceptions import BadRequestError, ConflictError, NotFoundError, ForbiddenError
 from ..models import User, Team
-from ..utils.controller_decorators import call_before, get_resource
+from ..utils.pipeline import pipeline
 from ..utils.controller_validators import (
     validate_accept_header,
     validate_content_type_header,
 )
+from ..utils.baked_queries import find_active
 from ..utils.is_valid_uuid import is_valid_uuid
-
-
-def validate_user_uuid(*args, user_id):
-    if not is_valid_uuid(user_id):
-        raise BadRequestError(f"User ID {user_id} is not a valid UUID")
+from ..utils.invalidation import mark_stale
 
 
 def validate_is_current_user(*args, user_id):
@@ -27,7 +24,8 @@ def validate_is_current_user(*args, user_id):
 
 
 def validate_request_structure(*args, **kwargs):
-    if ("data" not in request.json) or (not isinstance(request.json["data"], list)):
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get("data"), list):
         raise BadRequestError(
             "Invalid request body - must have 'data' property of type 'list'"
         )
@@ -70,7 +68,7 @@ def get_team(relationship_object, index):
     validate_type_is_teams(relationship_object, index)
     team_id = relationship_object.get("id")
     validate_team_uuid_is_valid_uuid(team_id, index)
-    team = Team.query.filter_by(id=team_id).first()
+    team = find_active(Team, id=team_id)
     validate_team_exists(team, team_id, index)
     return team
 
@@ -96,17 +94,13 @@ def make_error_response(errors):
 
 
 class UserRelationshipTeams(Resource):
-    @jwt_required
-    @call_before(
-        [
-            validate_accept_header,
-            validate_content_type_header,
-            validate_user_uuid,
-            validate_is_current_user,
-            validate_request_structure,
-        ]
+    @pipeline(
+        budget="write",
+        validate=[validate_accept_header, validate_content_type_header],
+        auth="access",
+        authorize=[validate_is_current_user, validate_request_structure],
+        load=User,
     )
-    @get_resource(User)
     def post(self, user):
         # pylint: disable=no-self-use
         teams, errors = get_teams_and_errors()
@@ -117,6 +111,8 @@ class UserRelationshipTeams(Resource):
             return None, 204
         for team in teams_to_add:
             user.teams.append(team)
+        mark_stale("users", user.id)
+        mark_stale("teams", *(team.id for team in teams_to_add))
         DB.session.add(user)
         DB.session.commit()
         return (
@@ -130,25 +126,23 @@ class UserRelationshipTeams(Resource):
             201,
         )
 
-    @jwt_required
-    @call_before(
-        [
-            validate_accept_header,
-            validate_content_type_header,
-            validate_user_uuid,
-            validate_is_current_user,
-            validate_request_structure,
-        ]
+    @pipeline(
+        budget="write",
+        validate=[validate_accept_header, validate_content_type_header],
+        auth="access",
+        authorize=[validate_is_current_user, validate_request_structure],
+        load=User,
     )
-    @get_resource(User)
     def delete(self, user):
         # pylint: disable=no-self-use
         teams, errors = get_teams_and_errors()
         if len(errors) > 0:
             return make_error_response(errors)
-        for team in teams:
-            if team in user.teams:
-                user.teams.remove(team)
+        teams_to_remove = [team for team in teams if team in user.teams]
+        for team in teams_to_remove:
+            user.teams.remove(team)
+        mark_stale("users", user.id)
+        mark_stale("teams", *(team.id for team in teams_to_remove))
         DB.session.add(user)
         DB.session.commit()
         return None, 204
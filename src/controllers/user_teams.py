@@ -1,17 +1,14 @@
 from flask import request
 from flask_restful import Resource
-from flask_jwt_extended import jwt_required
 
-from ..exceptions import BadRequestError
 from ..models import User, Team
-from ..utils.controller_decorators import call_before, get_resource
+from ..utils.pipeline import pipeline
 from ..utils.controller_validators import validate_accept_header
-from ..utils.is_valid_uuid import is_valid_uuid
+from ..utils.fingerprints import get_user_teams_fingerprint
 
 
-def validate_uuid(*args, user_id):
-    if not is_valid_uuid(user_id):
-        raise BadRequestError(f"User ID {user_id} is not a valid UUID")
+def get_fingerprint(*args, user_id):
+    return get_user_teams_fingerprint(user_id)
 
 
 def make_team_resource_object(team):
@@ -45,12 +42,18 @@ def make_team_resource_object(team):
 
 
 class UserTeams(Resource):
-    @jwt_required
-    @call_before([validate_accept_header, validate_uuid])
-    @get_resource(User)
+    @pipeline(
+        budget="collection",
+        validate=[validate_accept_header],
+        auth="access",
+        load=User,
+        fingerprint=get_fingerprint,
+    )
     def get(self, user):
         # pylint: disable=no-self-use
-        teams = Team.query.filter(Team.members.any(User.id == user.id)).all()
+        teams = Team.query.filter(
+            Team.members.any(User.id == user.id), Team.is_active
+        ).all()
         return {
             "links": {"self": request.url},
             "data": [make_team_resource_object(team) for team in teams],
@@ -1,3 +1,14 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import orm
 
-DB = SQLAlchemy()
+from .utils.read_replicas import RoutingSession
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, extension=self, **options)
+
+
+# objects aren't expired on commit, so that controllers can serialize what they've just written
+# without reloading it; every request gets a new session, so nothing stale outlives the request
+DB = RoutingSQLAlchemy(session_options={"expire_on_commit": False})
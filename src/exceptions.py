@@ -1,8 +1,9 @@
 def make_error_response(error):
-    return dict(errors=[error.to_dict()]), error.status
+    errors = error.errors if isinstance(error, BadRequestErrors) else [error]
+    return dict(errors=[e.to_dict() for e in errors]), error.status
 
 
-class ClientError(Exception):
+class APIError(Exception):
     status = -1
     default_message = ""
     default_title = ""
@@ -23,12 +24,31 @@ class ClientError(Exception):
         )
 
 
+class ClientError(APIError):
+    pass
+
+
+class ServerError(APIError):
+    pass
+
+
 class BadRequestError(ClientError):
     status = 400
     default_title = "Bad Request"
     default_message = "The requested operation could not be completed"
 
 
+class BadRequestErrors(BadRequestError):
+    """
+    Several problems with a single request, such as one for each of its invalid arguments, which
+    are reported together.
+    """
+
+    def __init__(self, errors):
+        super().__init__()
+        self.errors = errors
+
+
 class UnauthorizedError(ClientError):
     status = 401
     default_title = "Unauthorized"
@@ -80,3 +100,29 @@ class UnprocessableEntityError(ClientError):
     default_message = (
         "The requested operation could not be completed due to semantic errors"
     )
+
+
+class TooManyRequestsError(ClientError):
+    status = 429
+    default_title = "Too Many Requests"
+    default_message = (
+        "The requested operation could not be completed because too many requests have been made "
+        "in a short period of time"
+    )
+
+
+class ServiceUnavailableError(ServerError):
+    status = 503
+    default_title = "Service Unavailable"
+    default_message = (
+        "The requested operation could not be completed because the server is temporarily "
+        "overloaded"
+    )
+
+
+class GatewayTimeoutError(ServerError):
+    status = 504
+    default_title = "Gateway Timeout"
+    default_message = (
+        "The requested operation could not be completed because it took too long"
+    )
@@ -1,3 +1,4 @@
 from .user import User
 from .team import Team
 from .team_membership import TeamMembership
+from .rate_limit_bucket import RateLimitBucket
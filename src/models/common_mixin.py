@@ -7,6 +7,10 @@ from ..db import DB
 
 
 class CommonMixin:
+    # fetch server generated columns (such as id and created_at) with RETURNING when inserting, so
+    # that new resources can be serialized without querying for them again
+    __mapper_args__ = {"eager_defaults": True}
+
     id = DB.Column(
         UUID(as_uuid=False),
         primary_key=True,
@@ -19,3 +23,16 @@ class CommonMixin:
     is_active = DB.Column(
         DB.Boolean, nullable=False, server_default=sql.expression.true()
     )
+
+    def update(self, **values):
+        """
+        Sets the attributes given non-null values which differ from their current ones, and returns
+        whether there were any, so that unchanged resources needn't be written (or invalidated).
+        """
+
+        changed = False
+        for key, value in values.items():
+            if value is not None and getattr(self, key) != value:
+                setattr(self, key, value)
+                changed = True
+        return changed
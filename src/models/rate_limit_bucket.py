@@ -0,0 +1,20 @@
+from sqlalchemy import func
+
+from ..db import DB
+
+
+class RateLimitBucket(DB.Model):
+    """
+    A token bucket shared by every worker, used by the database rate limiting backend. The table is
+    unlogged: losing its contents in a crash only means that clients start with full buckets.
+    """
+
+    __tablename__ = "rate_limit_buckets"
+    __table_args__ = {"prefixes": ["UNLOGGED"]}
+
+    key = DB.Column(DB.String, primary_key=True)
+    tokens = DB.Column(DB.Float, nullable=False)
+    allowed = DB.Column(DB.Boolean, nullable=False)
+    refilled_at = DB.Column(
+        DB.DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
@@ -33,15 +33,25 @@ class TeamMembership(CommonMixin, DB.Model):
         default=get_jwt_identity,
         nullable=True,
     )
+    # as with User.teams, the memberships of a user or team awaiting purge are left out of the
+    # other side's relationships
     user = DB.relationship(
         "User",
-        backref=DB.backref("team_memberships"),
+        backref=DB.backref(
+            "team_memberships",
+            primaryjoin="and_(User.id == TeamMembership.user_id, "
+            "TeamMembership.team_id.in_(select([Team.id]).where(Team.is_active)))",
+        ),
         foreign_keys=[user_id],
         viewonly=True,
     )
     team = DB.relationship(
         "Team",
-        backref=DB.backref("team_memberships"),
+        backref=DB.backref(
+            "team_memberships",
+            primaryjoin="and_(Team.id == TeamMembership.team_id, "
+            "TeamMembership.user_id.in_(select([User.id]).where(User.is_active)))",
+        ),
         foreign_keys=[team_id],
         viewonly=True,
     )
@@ -1,4 +1,4 @@
-import bcrypt
+from flask import current_app
 from flask_restful import fields
 from sqlalchemy import Enum
 
@@ -20,12 +20,16 @@ class User(CommonMixin, DB.Model):
         nullable=False,
         server_default="public",
     )
+    # inactive users and teams are awaiting purge (see utils/purge.py), so they're left out of each
+    # other's relationships, even though their memberships remain until then
     teams = DB.relationship(
         "Team",
         secondary="team_memberships",
         lazy="subquery",
-        backref=DB.backref("members", lazy=True),
-        primaryjoin="User.id == TeamMembership.user_id",
+        passive_deletes=True,
+        backref=DB.backref("members", lazy=True, passive_deletes=True),
+        primaryjoin="and_(User.id == TeamMembership.user_id, User.is_active)",
+        secondaryjoin="and_(Team.id == TeamMembership.team_id, Team.is_active)",
     )
     marshaller = CommonMarshaller(
         {
@@ -43,14 +47,45 @@ class User(CommonMixin, DB.Model):
 
     @password.setter
     def password(self, password):
-        self.password_hash = bcrypt.hashpw(
-            password.encode("utf-8"), bcrypt.gensalt()
-        ).decode("utf-8")
+        self.password_hash = current_app.extensions["password_hasher"].hash(password)
 
     def has_password(self, password):
-        return bcrypt.checkpw(
-            password.encode("utf-8"), self.password_hash.encode("utf-8")
+        return current_app.extensions["password_hasher"].verify(
+            password, self.password_hash
         )
 
+    def password_needs_rehash(self):
+        return current_app.extensions["password_hasher"].needs_rehash(
+            self.password_hash
+        )
+
+    def update(self, password=None, **values):
+        # the password is verified before it's hashed, since clients commonly send it unchanged
+        changed = super().update(**values)
+        if password is not None and not self.has_password(password):
+            self.password = password
+            changed = True
+        return changed
+
+    @classmethod
+    def find_taken(cls, **values):
+        """
+        Returns the names of the unique fields (username, email) whose given values already belong
+        to a user. Each check selects only the indexed column, so it can be answered from the
+        unique index alone, and no password is ever hashed along the way.
+        """
+
+        names = [name for name in ("username", "email") if values.get(name) is not None]
+        if not names:
+            return []
+        checks = [
+            DB.session.query(getattr(cls, name))
+            .filter(getattr(cls, name) == values[name])
+            .exists()
+            for name in names
+        ]
+        results = DB.session.query(*checks).one()
+        return [name for name, taken in zip(names, results) if taken]
+
     def __repr__(self):
         return f"<User(first_name='{self.first_name}', last_name='{self.last_name}')>"
@@ -0,0 +1,28 @@
+"""
+Baked versions of the lookups made on almost every request, so that SQLAlchemy only builds and
+compiles their SQL once per process rather than on every call (see
+https://docs.sqlalchemy.org/en/13/orm/extensions/baked.html). scripts/benchmark_queries.py
+measures the difference.
+"""
+
+from sqlalchemy import bindparam
+from sqlalchemy.ext import baked
+
+from ..db import DB
+
+BAKERY = baked.bakery()
+
+
+def find_active(model, **criteria):
+    """
+    Returns the active instance of the model whose columns have the given values, or None if there
+    isn't one, e.g. find_active(User, username="username").
+    """
+
+    names = tuple(sorted(criteria))
+    # the model and column names are part of the cache key, since the lambdas close over them
+    query = BAKERY(lambda session: session.query(model), model, names)
+    query += lambda q: q.filter_by(
+        is_active=True, **{name: bindparam(name) for name in names}
+    )
+    return query(DB.session()).params(**criteria).first()
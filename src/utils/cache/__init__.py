@@ -0,0 +1,27 @@
+"""
+Caches used by the application. Every cache implements the interface of `Cache` (see base.py):
+get, set and delete_many, with an optional time-to-live per entry, tag-based invalidation and
+hit/miss/eviction counters. The backend is chosen by the CACHE_BACKEND setting:
+
+- memory: an in-process LRU cache, private to each worker
+- shared_memory: an SQLite database in /dev/shm, shared by the workers on a node
+- redis: a Redis server, shared by every worker on every node
+"""
+
+from .base import Cache
+from .memory import MemoryCache
+from .redis import RedisCache
+from .shared_memory import SharedMemoryCache
+
+BACKENDS = dict(memory=MemoryCache, shared_memory=SharedMemoryCache, redis=RedisCache)
+
+
+def create_cache(app, namespace, max_entries=None, max_bytes=None, ttl=None):
+    backend = BACKENDS[app.config["CACHE_BACKEND"]]
+    return backend(
+        namespace=namespace,
+        url=app.config["CACHE_URL"],
+        max_entries=max_entries,
+        max_bytes=max_bytes,
+        ttl=ttl,
+    )
@@ -0,0 +1,161 @@
+"""
+The interface shared by every cache backend.
+
+Entries may be tagged, e.g. with the (resource_type, resource_id) pairs they were computed from.
+Each tag has a version, an arbitrary token which is stored in the cache alongside the entries and
+discarded when the tag is invalidated. An entry records the versions of its tags when it is set,
+and is only served while they are all still current. Because versions are random, a tag whose
+version has been evicted simply gets a new one, which invalidates its entries rather than
+reviving them.
+"""
+
+import json
+import threading
+import uuid
+
+_TAG_KEY_PREFIX = "\x00tag"
+
+
+class Cache:
+    """
+    Backends implement `_get_many`, `_set_many`, `_delete_many`, `_clear` and `_count_evictions`.
+    They store entries as (value, tag_versions) pairs. Backends whose entries are visible to every
+    worker set `shared` to True.
+    """
+
+    shared = False
+
+    def __init__(self, max_entries=None, max_bytes=None, ttl=None):
+        """
+        Backends which evict entries themselves are bounded by `max_entries` and `max_bytes`; `ttl`
+        is the default time to live of entries, in seconds.
+        """
+
+        self.ttl = ttl
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._stats_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key, default=None):
+        entry = self._get_many([key]).get(key)
+        if entry is not None:
+            value, tag_versions = entry
+            if not tag_versions or self._is_current(tag_versions):
+                self._record(hits=1)
+                return value
+        self._record(misses=1)
+        return default
+
+    def get_many(self, keys):
+        """
+        Looks up a number of keys at once, returning a dict of those which were found.
+        """
+
+        keys = list(keys)
+        if not keys:
+            return {}
+        found = {
+            key: value
+            for key, (value, tag_versions) in self._get_many(keys).items()
+            if not tag_versions or self._is_current(tag_versions)
+        }
+        self._record(hits=len(found), misses=len(keys) - len(found))
+        return found
+
+    def set(self, key, value, ttl=None, tags=()):
+        """
+        Stores a value. `tags` is either a collection of tags or, for values which mustn't outlive
+        an invalidation that happens while they're being computed, the result of calling
+        `get_tag_versions` before computing them.
+        """
+
+        tag_versions = (
+            tags if isinstance(tags, dict) else self.get_tag_versions(tags)
+        ) or None
+        self._set_many(
+            {key: (value, tag_versions)}, ttl if ttl is not None else self.ttl
+        )
+
+    def set_many(self, values, ttl=None):
+        """
+        Stores a number of untagged values at once, from a dict of keys to values.
+        """
+
+        if values:
+            self._set_many(
+                {key: (value, None) for key, value in values.items()},
+                ttl if ttl is not None else self.ttl,
+            )
+
+    def delete_many(self, keys):
+        keys = list(keys)
+        if keys:
+            self._delete_many(keys)
+
+    def get_tag_versions(self, tags):
+        tags = list(tags)
+        if not tags:
+            return {}
+        versions = self._get_tag_versions(tags)
+        missing = {tag: uuid.uuid4().hex for tag in tags if tag not in versions}
+        if missing:
+            self._set_many(
+                {_tag_key(tag): (version, None) for tag, version in missing.items()},
+                None,
+            )
+        return {**versions, **missing}
+
+    def invalidate_tags(self, tags):
+        self.delete_many(_tag_key(tag) for tag in tags)
+
+    def clear(self):
+        self._clear()
+
+    def stats(self):
+        with self._stats_lock:
+            hits, misses = self._hits, self._misses
+        return dict(hits=hits, misses=misses, evictions=self._count_evictions())
+
+    def _is_current(self, tag_versions):
+        return self._get_tag_versions(list(tag_versions)) == tag_versions
+
+    def _get_tag_versions(self, tags):
+        entries = self._get_many([_tag_key(tag) for tag in tags])
+        return {
+            tag: entries[_tag_key(tag)][0] for tag in tags if _tag_key(tag) in entries
+        }
+
+    def _record(self, hits=0, misses=0):
+        with self._stats_lock:
+            self._hits += hits
+            self._misses += misses
+
+    def _get_many(self, keys):
+        raise NotImplementedError
+
+    def _set_many(self, entries, ttl):
+        raise NotImplementedError
+
+    def _delete_many(self, keys):
+        raise NotImplementedError
+
+    def _clear(self):
+        raise NotImplementedError
+
+    def _count_evictions(self):
+        raise NotImplementedError
+
+
+def _tag_key(tag):
+    return (_TAG_KEY_PREFIX, tag)
+
+
+def encode_key(key):
+    """
+    Encodes a key as a string, for backends which can't store arbitrary Python objects as keys.
+    Keys are tuples of strings and numbers, which encode as JSON arrays.
+    """
+
+    return json.dumps(key, separators=(",", ":"), default=str)
@@ -0,0 +1,79 @@
+"""
+A thread-safe, in-process cache with least-recently-used eviction. The cache can be bounded by its
+number of entries, by the total size of its values, or both. Entries are only visible to the
+worker process which set them.
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from .base import Cache
+
+
+def _sizeof(value):
+    if isinstance(value, tuple):
+        return sum(_sizeof(item) for item in value)
+    return len(value) if isinstance(value, (bytes, str)) else sys.getsizeof(value)
+
+
+class MemoryCache(Cache):
+    def __init__(self, namespace=None, url=None, **bounds):
+        # pylint: disable=unused-argument
+        super().__init__(**bounds)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._size = 0
+        self._evictions = 0
+
+    def _get_many(self, keys):
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                item = self._entries.get(key)
+                if item is None:
+                    continue
+                entry, expires_at, _ = item
+                if expires_at is not None and expires_at <= now:
+                    self._remove(key)
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = entry
+        return found
+
+    def _set_many(self, entries, ttl):
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            for key, entry in entries.items():
+                self._remove(key)
+                size = _sizeof(entry[0])
+                self._entries[key] = (entry, expires_at, size)
+                self._size += size
+            while self._is_full():
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def _delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._remove(key)
+
+    def _clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _count_evictions(self):
+        return self._evictions
+
+    def _is_full(self):
+        return (
+            self._max_entries is not None and len(self._entries) > self._max_entries
+        ) or (self._max_bytes is not None and self._size > self._max_bytes)
+
+    def _remove(self, key):
+        item = self._entries.pop(key, None)
+        if item is not None:
+            self._size -= item[2]
@@ -0,0 +1,164 @@
+"""
+A cache kept in a Redis server (or anything else which speaks its protocol), shared by every worker
+on every node. The server is responsible for bounding the cache, according to its own maxmemory
+policy, so the max_entries and max_bytes limits are ignored; its eviction count is the server's
+and covers every namespace.
+
+The client is deliberately minimal: it implements just enough of the Redis serialization protocol
+(RESP) for the handful of commands used here. Errors talking to the server are logged and treated
+as misses, so that an unavailable cache degrades performance rather than failing requests.
+"""
+
+import logging
+import os
+import pickle
+import socket
+import threading
+from urllib.parse import urlparse
+
+from .base import Cache, encode_key
+
+LOGGER = logging.getLogger(__name__)
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisConnection:
+    def __init__(self, url, timeout=1):
+        parsed = urlparse(url)
+        self._socket = socket.create_connection(
+            (parsed.hostname or "localhost", parsed.port or 6379), timeout
+        )
+        self._reader = self._socket.makefile("rb")
+        if parsed.password:
+            self.execute("AUTH", parsed.password)
+        database = parsed.path.lstrip("/")
+        if database and database != "0":
+            self.execute("SELECT", database)
+
+    def execute(self, *command):
+        return self.pipeline([command])[0]
+
+    def pipeline(self, commands):
+        """
+        Sends a number of commands at once and then reads all of their replies, saving a round
+        trip per command.
+        """
+
+        self._socket.sendall(b"".join(_encode_command(command) for command in commands))
+        replies = [self._read_reply() for _ in commands]
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    def close(self):
+        self._reader.close()
+        self._socket.close()
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Connection closed by the server")
+        prefix, payload = line[:1], line[1:-2]
+        if prefix == b"+":
+            return payload.decode()
+        if prefix == b"-":
+            return RedisError(payload.decode())
+        if prefix == b":":
+            return int(payload)
+        if prefix == b"$":
+            length = int(payload)
+            return None if length == -1 else self._reader.read(length + 2)[:-2]
+        if prefix == b"*":
+            length = int(payload)
+            return None if length == -1 else [self._read_reply() for _ in range(length)]
+        raise RedisError(f"Unexpected reply from the server: {line!r}")
+
+
+def _encode_command(command):
+    arguments = [
+        argument if isinstance(argument, bytes) else str(argument).encode()
+        for argument in command
+    ]
+    return b"".join(
+        [f"*{len(arguments)}\r\n".encode()]
+        + [b"$%d\r\n%s\r\n" % (len(argument), argument) for argument in arguments]
+    )
+
+
+class RedisCache(Cache):
+    shared = True
+
+    def __init__(self, namespace="default", url=None, **bounds):
+        super().__init__(**bounds)
+        self.url = url or "redis://localhost:6379/0"
+        self._prefix = f"marathon:{namespace}:"
+        self._local = threading.local()
+
+    def _execute(self, commands, default=None):
+        # connections are per thread, and aren't reused after a fork
+        connection, pid = getattr(self._local, "connection", (None, None))
+        try:
+            if pid != os.getpid():
+                connection = RedisConnection(self.url)
+                self._local.connection = (connection, os.getpid())
+            return connection.pipeline(commands)
+        except (OSError, RedisError):
+            LOGGER.exception("Cache command failed")
+            if pid == os.getpid():
+                connection.close()
+            self._local.connection = (None, None)
+            return default
+
+    def _get_many(self, keys):
+        encoded_keys = {self._prefix + encode_key(key): key for key in keys}
+        replies = self._execute([("MGET", *encoded_keys)])
+        if replies is None:
+            return {}
+        return {
+            key: pickle.loads(value)
+            for key, value in zip(encoded_keys.values(), replies[0])
+            if value is not None
+        }
+
+    def _set_many(self, entries, ttl):
+        self._execute(
+            [
+                (
+                    "SET",
+                    self._prefix + encode_key(key),
+                    pickle.dumps(entry, pickle.HIGHEST_PROTOCOL),
+                    *(("PX", int(ttl * 1000)) if ttl is not None else ()),
+                )
+                for key, entry in entries.items()
+            ]
+        )
+
+    def _delete_many(self, keys):
+        self._execute([("DEL", *(self._prefix + encode_key(key) for key in keys))])
+
+    def _clear(self):
+        cursor = "0"
+        while True:
+            replies = self._execute(
+                [("SCAN", cursor, "MATCH", self._prefix + "*", "COUNT", 1000)]
+            )
+            if replies is None:
+                return
+            cursor, keys = replies[0]
+            if keys:
+                self._execute([("DEL", *keys)])
+            if cursor in (b"0", "0"):
+                return
+
+    def _count_evictions(self):
+        replies = self._execute([("INFO", "stats")])
+        if replies is None:
+            return None
+        for line in replies[0].decode().splitlines():
+            if line.startswith("evicted_keys:"):
+                return int(line.split(":")[1])
+        return None
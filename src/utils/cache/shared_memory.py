@@ -0,0 +1,200 @@
+"""
+A cache shared by every worker process on a node. Entries are kept in an SQLite database which, by
+default, lives in /dev/shm so that it is backed by memory rather than disk. Like the memory cache,
+it can be bounded by its number of entries and by the total size of its values, evicting the
+least recently used entries first.
+
+Each namespace has its own database file. The running totals used to enforce the bounds are
+maintained by triggers, so that they needn't be recomputed on every write.
+
+SQLite allows only one writer at a time, so reads don't write: the entries a worker reads are only
+marked as used the next time it writes, or once it has read enough of them. Like the Redis cache,
+the cache behaves as if it were empty when the database can't be used (e.g. while it's locked for
+longer than the busy timeout), rather than failing the request.
+"""
+
+import logging
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+
+from .base import Cache, encode_key
+
+LOGGER = logging.getLogger(__name__)
+
+# the number of entries read before they're marked as used, if the worker hasn't written since
+MAX_PENDING_USES = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_used_at ON entries (used_at);
+CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at);
+CREATE TABLE IF NOT EXISTS totals (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    entries INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO totals VALUES (0, 0, 0);
+CREATE TRIGGER IF NOT EXISTS entries_inserted AFTER INSERT ON entries BEGIN
+    UPDATE totals SET entries = entries + 1, size = size + new.size;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_updated AFTER UPDATE OF size ON entries BEGIN
+    UPDATE totals SET size = size + new.size - old.size;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_deleted AFTER DELETE ON entries BEGIN
+    UPDATE totals SET entries = entries - 1, size = size - old.size;
+END;
+"""
+
+
+def _default_directory():
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+class SharedMemoryCache(Cache):
+    shared = True
+
+    def __init__(self, namespace="default", url=None, **bounds):
+        super().__init__(**bounds)
+        self.path = os.path.join(
+            url or _default_directory(), f"marathon-cache-{namespace}.sqlite3"
+        )
+        self._local = threading.local()
+        self._evictions = 0
+        self._uses_lock = threading.Lock()
+        self._pending_uses = {}
+        with self._connect() as connection:
+            connection.executescript(_SCHEMA)
+
+    def _connect(self):
+        # connections can't be shared between threads, nor survive a fork
+        connection, pid = getattr(self._local, "connection", (None, None))
+        if pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = OFF")
+            self._local.connection = (connection, os.getpid())
+        return connection
+
+    def _get_many(self, keys):
+        encoded_keys = {encode_key(key): key for key in keys}
+        placeholders = ", ".join("?" * len(encoded_keys))
+        now = time.time()
+        try:
+            rows = (
+                self._connect()
+                .execute(
+                    f"SELECT key, value FROM entries WHERE key IN ({placeholders}) "
+                    "AND (expires_at IS NULL OR expires_at > ?)",
+                    (*encoded_keys, now),
+                )
+                .fetchall()
+            )
+        except sqlite3.Error:
+            LOGGER.exception("Cache read failed")
+            return {}
+        if rows:
+            with self._uses_lock:
+                self._pending_uses.update((key, now) for key, _ in rows)
+                flush = len(self._pending_uses) >= MAX_PENDING_USES
+            if flush:
+                self._write(lambda connection: None)
+        return {encoded_keys[key]: pickle.loads(value) for key, value in rows}
+
+    def _set_many(self, entries, ttl):
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        rows = []
+        for key, entry in entries.items():
+            value = pickle.dumps(entry, pickle.HIGHEST_PROTOCOL)
+            rows.append((encode_key(key), value, len(value), expires_at, now))
+
+        def insert(connection):
+            connection.executemany(
+                "INSERT INTO entries (key, value, size, expires_at, used_at) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                "value = excluded.value, size = excluded.size, "
+                "expires_at = excluded.expires_at, used_at = excluded.used_at",
+                rows,
+            )
+            self._evict(connection, now)
+
+        self._write(insert)
+
+    def _write(self, func):
+        """
+        Calls `func` with a connection in a write transaction, after marking the entries this worker
+        has read since it last wrote as used.
+        """
+
+        with self._uses_lock:
+            uses, self._pending_uses = self._pending_uses, {}
+        try:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.executemany(
+                    "UPDATE entries SET used_at = max(used_at, ?) WHERE key = ?",
+                    ((used_at, key) for key, used_at in uses.items()),
+                )
+                func(connection)
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        except sqlite3.Error:
+            LOGGER.exception("Cache write failed")
+
+    def _evict(self, connection, now):
+        if not self._count_excess(connection):
+            return
+        connection.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+        excess = self._count_excess(connection)
+        while excess:
+            self._evictions += connection.execute(
+                "DELETE FROM entries WHERE key IN "
+                "(SELECT key FROM entries ORDER BY used_at LIMIT ?)",
+                (excess,),
+            ).rowcount
+            excess = self._count_excess(connection)
+
+    def _count_excess(self, connection):
+        """
+        Returns how many entries need evicting to bring the cache back within its bounds, or at
+        least how many to evict before checking again.
+        """
+
+        entries, size = connection.execute(
+            "SELECT entries, size FROM totals"
+        ).fetchone()
+        excess = 0
+        if self._max_entries is not None:
+            excess = max(excess, entries - self._max_entries)
+        if self._max_bytes is not None and size > self._max_bytes:
+            excess = max(excess, 1)
+        return excess
+
+    def _delete_many(self, keys):
+        encoded_keys = [encode_key(key) for key in keys]
+        self._write(
+            lambda connection: connection.execute(
+                "DELETE FROM entries WHERE key IN "
+                f"({', '.join('?' * len(encoded_keys))})",
+                encoded_keys,
+            )
+        )
+
+    def _clear(self):
+        self._write(lambda connection: connection.execute("DELETE FROM entries"))
+
+    def _count_evictions(self):
+        return self._evictions
@@ -1,13 +1,19 @@
 """
 Decorators which can be used to wrap controller methods in order to provide
-common functionality.
+common functionality. Controllers don't stack these directly, but declare which
+they need with utils/pipeline.py, which applies them in a consistent order.
 """
 
 import functools
+import hashlib
+import json
 
-from flask import request
+from flask import current_app, request
 from flask_restful import marshal
+from flask_restful.representations.json import output_json
 
+from .baked_queries import find_active
+from .read_replicas import current_replica, reading_from_primary
 from .string_transformations import camel_to_snake
 from ..exceptions import NotFoundError
 
@@ -35,11 +41,35 @@ def call_before(callbacks):
     return decorator
 
 
+def rate_limit(name, key):
+    """
+    Consumes a token from the named rate limit before calling the wrapped function, raising a
+    TooManyRequestsError once the bucket is empty. The `key` callback receives the same arguments
+    as the wrapped function and determines whose bucket is charged (e.g. the client's IP address).
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            current_app.extensions["rate_limiter"].consume(name, key(*args, **kwargs))
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
 def get_resource(model):
     """
-    Retrieves an individual resource by it's ID, raising a NotFoundError if no
-    such resource exists. This is intended as a convenient wrapper for resource
-    detail controller methods, which commonly need to perform this operation.
+    Retrieves an individual resource by it's ID, raising a NotFoundError if no such resource exists
+    (or if it has been deleted and is awaiting purging). This is intended as a convenient wrapper
+    for resource detail controller methods, which commonly need to perform this operation.
+
+    IDs which don't exist are remembered for a short time in the missing resources cache, so that
+    repeated requests for them needn't query the database. Controllers which create resources must
+    mark them as stale (see utils/invalidation.py) to evict their IDs from it. A resource missing
+    from a read replica is looked for again on the primary before it's remembered, since it may
+    just not have been replicated yet.
     """
 
     model_name = model.__name__
@@ -47,10 +77,17 @@ def get_resource(model):
 
     def decorator(func):
         @functools.wraps(func)
+        @reject_known_missing(model)
         def wrapper(*args, **kwargs):
             resource_id = kwargs[f"{snake_case_model_name}_id"]
-            resource = model.query.filter_by(id=resource_id).first()
+            resource = find_active(model, id=resource_id)
+            if not resource and current_replica() is not None:
+                with reading_from_primary():
+                    resource = find_active(model, id=resource_id)
             if not resource:
+                current_app.extensions["missing_resources_cache"].set(
+                    (model.__tablename__, resource_id), True
+                )
                 raise NotFoundError(f"No {model_name} exists with the ID {resource_id}")
             return func(*args, **dict(zip((snake_case_model_name,), (resource,))))
 
@@ -59,11 +96,141 @@ def get_resource(model):
     return decorator
 
 
+def reject_known_missing(model):
+    """
+    Raises a NotFoundError without calling the wrapped function if get_resource has recently found
+    that the requested resource doesn't exist. get_resource already does this itself, but GET
+    methods should also use this decorator before any (such as conditional_get) which would
+    otherwise query for the resource first.
+    """
+
+    model_name = model.__name__
+    snake_case_model_name = camel_to_snake(model_name)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            resource_id = kwargs[f"{snake_case_model_name}_id"]
+            if current_app.extensions["missing_resources_cache"].get(
+                (model.__tablename__, resource_id)
+            ):
+                raise NotFoundError(f"No {model_name} exists with the ID {resource_id}")
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def conditional_get(get_fingerprint):
+    """
+    Supports conditional GET requests by computing a weak ETag from a cheap fingerprint of the
+    requested resource(s). When the request's `If-None-Match` header matches it, a 304 response is
+    returned without calling the wrapped function, so nothing is loaded or serialized. Otherwise the
+    ETag is attached to the wrapped function's response.
+
+    `get_fingerprint` receives the same arguments as the wrapped function and returns a tuple of
+    values (such as timestamps and row counts) which changes whenever the response would, or None
+    if the resource doesn't exist, in which case the wrapped function is called as normal.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            fingerprint = get_fingerprint(*args, **kwargs)
+            if fingerprint is None:
+                return func(*args, **kwargs)
+            etag = hashlib.sha1(repr(tuple(fingerprint)).encode("utf-8")).hexdigest()
+            if request.if_none_match.contains_weak(etag):
+                return _not_modified(etag)
+            return _add_etag(func(*args, **kwargs), etag)
+
+        return wrapper
+
+    return decorator
+
+
+def _not_modified(etag):
+    response = current_app.response_class(status=304)
+    response.set_etag(etag, weak=True)
+    return response
+
+
+def _add_etag(response, etag):
+    if isinstance(response, current_app.response_class):
+        response.set_etag(etag, weak=True)
+        return response
+    body, status_code = response if isinstance(response, tuple) else (response, 200)
+    return body, status_code, {"ETag": f'W/"{etag}"'}
+
+
+def cache_response(model):
+    """
+    Serves the wrapped resource detail method's encoded response from the response cache when
+    possible, so that the resource needn't be queried or serialized. Only successful responses are
+    cached. Responses are tagged with the resource they describe, so controllers which modify
+    resources must mark them as stale (see utils/invalidation.py).
+
+    The tag's version is taken before the resource is queried, so that a response computed while
+    the resource is being changed by another request is never served once that change commits.
+    For the same reason, responses to be cached are computed from the primary database rather than
+    a read replica, which may not have caught up with a change that has already been invalidated.
+
+    Responses are cached along with their ETags (see conditional_get, which this wraps where both
+    are used), so that a hit answers conditional GETs without fingerprinting the resource.
+    """
+
+    resource_type = model.__tablename__
+    snake_case_model_name = camel_to_snake(model.__name__)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = current_app.extensions["response_cache"]
+            resource_id = kwargs[f"{snake_case_model_name}_id"]
+            key = (
+                request.endpoint,
+                request.host_url,
+                resource_id,
+                tuple(sorted(request.args.items(multi=True))),
+            )
+            cached = cache.get(key)
+            if cached is not None:
+                data, etag = cached
+                if etag is not None and request.if_none_match.contains_weak(etag):
+                    return _not_modified(etag)
+                response = current_app.response_class(data, status=200)
+                if etag is not None:
+                    response.set_etag(etag, weak=True)
+                return response
+            tag_versions = cache.get_tag_versions([(resource_type, resource_id)])
+            with reading_from_primary():
+                response = func(*args, **kwargs)
+            if not isinstance(response, current_app.response_class):
+                body, status_code, headers = (
+                    (*response, None)[:3]
+                    if isinstance(response, tuple)
+                    else (response, 200, None)
+                )
+                response = output_json(body, status_code, headers)
+            if response.status_code == 200:
+                etag, _ = response.get_etag()
+                cache.set(key, (response.get_data(), etag), tags=tag_versions)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
 def format_response(config):
     """
     Formats the resource(s) returned by a controller into a structure compliant with the JSON API
     specification. More information on the JSON API standard can be found at https://jsonapi.org/
 
+    The document is encoded here rather than by flask-restful, so that it can be assembled from
+    the encoded resource objects kept in the fragment cache.
+
     Parameters
     ----------
     config (dict): a configuration dict which allows for customization of the data included in the
@@ -114,7 +281,7 @@ def format_response(config):
             response = func(*args, **kwargs)
             formatted_body = _get_formatted_response_body(response, config)
             status_code = response[1] if isinstance(response, tuple) else 200
-            return formatted_body, status_code
+            return current_app.response_class(formatted_body, status=status_code)
 
         return wrapper
 
@@ -123,15 +290,24 @@ def format_response(config):
 
 def _get_formatted_response_body(response, config):
     resource_or_resource_list = _get_resource_or_resource_list(response)
-    return {
-        "links": {"self": request.url},
-        "data": _make_data(resource_or_resource_list, config),
-        **(
-            {"included": _make_included(resource_or_resource_list, config)}
-            if "relationships" in config
-            else {}
-        ),
-    }
+    resources = (
+        resource_or_resource_list
+        if isinstance(resource_or_resource_list, list)
+        else [resource_or_resource_list]
+    )
+    data = _render_resource_objects([(resource, config) for resource in resources])
+    body = [
+        b'{"links":',
+        _encode({"self": request.url}),
+        b',"data":',
+        b"[" + b",".join(data) + b"]"
+        if isinstance(resource_or_resource_list, list)
+        else data[0],
+    ]
+    if "relationships" in config:
+        included = _render_resource_objects(_get_included(resources, config))
+        body += [b',"included":[', b",".join(included), b"]"]
+    return b"".join(body + [b"}"])
 
 
 def _get_resource_or_resource_list(response):
@@ -140,24 +316,59 @@ def _get_resource_or_resource_list(response):
     return response
 
 
-def _make_data(resource_or_resource_list, config):
+def _render_resource_objects(resources_and_configs):
+    """
+    Renders the encoded resource object for each (resource, config) pair. The attributes and links
+    of each resource object are taken from the fragment cache where possible, keyed by the
+    resource's `updated_at` timestamp, so anything which changes a row must also bump its
+    `updated_at` (as utils/purge.py does when nulling references to a deleted user). Relationships
+    depend on other rows, so they're always rendered afresh and spliced into the cached fragment.
+    """
+
+    cache = current_app.extensions["fragment_cache"]
+    keys = [
+        _make_fragment_key(resource, config)
+        for resource, config in resources_and_configs
+    ]
+    fragments = cache.get_many(set(keys))
+    rendered = {}
+    for key, (resource, config) in zip(keys, resources_and_configs):
+        if key not in fragments:
+            fragments[key] = rendered[key] = _encode(
+                _make_resource_object(resource, config)
+            )
+    cache.set_many(rendered)
+    return [
+        fragments[key][:-1]
+        + b',"relationships":'
+        + _encode(_make_relationships(resource, config))
+        + b"}"
+        if "relationships" in config
+        else fragments[key]
+        for key, (resource, config) in zip(keys, resources_and_configs)
+    ]
+
+
+def _make_fragment_key(resource, config):
     return (
-        [
-            _make_resource_object(resource, config)
-            for resource in resource_or_resource_list
-        ]
-        if isinstance(resource_or_resource_list, list)
-        else _make_resource_object(resource_or_resource_list, config)
+        config["name"],
+        resource.id,
+        resource.updated_at.isoformat(),
+        tuple(config["marshaller"]),
+        request.host_url,
     )
 
 
+def _encode(value):
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
 def _make_resource_object(resource, config):
     return {
         "type": config["name"],
         "id": resource.id,
         "attributes": marshal(resource, config["marshaller"]),
         "links": {"self": f"{request.host_url}{config['name']}/{resource.id}"},
-        **(_make_relationships(resource, config) if "relationships" in config else {}),
     }
 
 
@@ -166,7 +377,7 @@ def _make_relationships(resource, config):
         _make_individual_relationship(resource, nested_config)
         for nested_config in config["relationships"]
     ]
-    return {"relationships": dict(i for r in relationships for i in r.items())}
+    return dict(i for r in relationships for i in r.items())
 
 
 def _make_individual_relationship(resource, config):
@@ -188,14 +399,10 @@ def _make_id_resource_object(resource, config):
     return {"type": config["name"], "id": resource.id}
 
 
-def _make_included(resource_or_resource_list, config):
+def _get_included(resources, config):
     return [
-        _make_resource_object(related_resource, relationship)
+        (related_resource, relationship)
         for relationship in config["relationships"]
-        for resource in (
-            resource_or_resource_list
-            if isinstance(resource_or_resource_list, list)
-            else [resource_or_resource_list]
-        )
+        for resource in resources
         for related_resource in getattr(resource, _get_related_name(relationship))
     ]
@@ -0,0 +1,44 @@
+"""
+Resolves the identity in a request's JWT to the handful of facts about the user which controllers
+need (whether they exist, whether they are active, and their visibility). This is registered as
+the JWT user loader, so it runs once per authenticated request and the result is available as
+`flask.g.current_user`. The facts are also kept in a process-wide cache for a short time, so that
+most requests don't need to query for the user at all. Users marked as stale (see
+utils/invalidation.py) are evicted from the cache, so the facts are always read from the primary
+database (see utils/read_replicas.py).
+"""
+
+from collections import namedtuple
+
+from flask import current_app, g
+
+from ..db import DB
+from ..models import User
+from .is_valid_uuid import is_valid_uuid
+from .read_replicas import reading_from_primary
+
+UserFacts = namedtuple("UserFacts", ["id", "exists", "is_active", "visibility"])
+
+
+def load_user_facts(identity):
+    cache = current_app.extensions["user_facts_cache"]
+    facts = cache.get(identity)
+    if facts is None:
+        with reading_from_primary():
+            facts = _query_user_facts(identity)
+        cache.set(identity, facts)
+    g.current_user = facts
+    return facts
+
+
+def _query_user_facts(identity):
+    row = (
+        DB.session.query(User.is_active, User.visibility).filter_by(id=identity).first()
+        if is_valid_uuid(identity)
+        else None
+    )
+    if row is None:
+        return UserFacts(identity, exists=False, is_active=False, visibility=None)
+    return UserFacts(
+        identity, exists=True, is_active=row.is_active, visibility=row.visibility
+    )
@@ -0,0 +1,81 @@
+"""
+Cheap summaries of the rows which make up a response, used to compute ETags without loading or
+serializing any resources. Each fingerprint combines the `updated_at` timestamps and row counts of
+the primary resource(s), their team memberships, and the resources related through those
+memberships, so that any change which would alter the response also changes the fingerprint.
+That relies on every change to a row bumping its `updated_at`, including the nulling of references
+to a deleted user (see utils/purge.py).
+"""
+
+from sqlalchemy import func, select
+
+from ..db import DB
+from ..models import Team, TeamMembership, User
+
+
+def get_detail_fingerprint(
+    model, resource_id, membership_column, related_model, related_column
+):
+    """
+    Fingerprints an individual resource along with its memberships and the related resources they
+    point to, in a single query. Returns None if no such resource exists.
+
+    For a team, this would be called as
+    get_detail_fingerprint(Team, team_id, TeamMembership.team_id, User, TeamMembership.user_id)
+    """
+
+    return (
+        DB.session.query(
+            model.updated_at,
+            func.count(TeamMembership.id),
+            func.max(TeamMembership.updated_at),
+            func.max(related_model.updated_at),
+        )
+        .outerjoin(TeamMembership, membership_column == model.id)
+        .outerjoin(related_model, related_model.id == related_column)
+        .filter(model.id == resource_id, model.is_active)
+        .group_by(model.id)
+        .first()
+    )
+
+
+def get_user_teams_fingerprint(user_id):
+    """
+    Fingerprints the teams of a user, along with all the memberships of those teams. Returns None
+    if no such user exists. Memberships of inactive users are left out, as they are of the teams'
+    members, so that a member being deleted changes the fingerprint.
+    """
+
+    if not DB.session.query(User.id).filter_by(id=user_id, is_active=True).first():
+        return None
+    user_team_ids = select([TeamMembership.team_id]).where(
+        TeamMembership.user_id == user_id
+    )
+    return (
+        DB.session.query(
+            func.count(TeamMembership.id),
+            func.max(TeamMembership.updated_at),
+            func.max(Team.updated_at),
+        )
+        .join(Team, Team.id == TeamMembership.team_id)
+        .join(User, User.id == TeamMembership.user_id)
+        .filter(
+            TeamMembership.team_id.in_(user_team_ids), Team.is_active, User.is_active
+        )
+        .one()
+    )
+
+
+def get_collection_fingerprint():
+    """
+    Fingerprints the users, teams and team memberships tables as a whole, for use by endpoints
+    which list every user or team along with their related resources.
+    """
+
+    return DB.session.query(
+        *(
+            select([aggregate]).as_scalar()
+            for model in (User, Team, TeamMembership)
+            for aggregate in (func.count(model.id), func.max(model.updated_at))
+        )
+    ).one()
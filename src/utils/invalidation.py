@@ -0,0 +1,158 @@
+"""
+Invalidation of cached data when resources change.
+
+Controllers which modify resources call `mark_stale` before committing. Once the transaction
+commits, the stale resources are evicted from this worker's caches. So that other workers (on this
+node or others) evict them too, the stale resources are also published on a Postgres NOTIFY
+channel from within the same transaction. Postgres only delivers notifications once the
+transaction commits, and drops them if it rolls back. Each worker runs an InvalidationListener
+thread which LISTENs on the channel and evicts the resources it is told about from its caches,
+other than those shared between workers (see utils/cache), which the publisher already evicted
+them from.
+"""
+
+import json
+import logging
+import select
+import threading
+
+from flask import current_app, has_app_context
+from flask_sqlalchemy import SignallingSession
+from sqlalchemy import create_engine, event, func
+from sqlalchemy.pool import NullPool
+
+from ..db import DB
+
+LOGGER = logging.getLogger(__name__)
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+MAX_RESOURCES_PER_NOTIFICATION = 100
+
+
+def mark_stale(resource_type, *resource_ids):
+    """
+    Records that cached data for the given resources must be invalidated once the current
+    transaction commits.
+    """
+
+    DB.session.info.setdefault("stale_resources", set()).update(
+        (resource_type, resource_id) for resource_id in resource_ids
+    )
+
+
+def invalidate_locally(app, resources, include_shared=True):
+    """
+    Evicts the given (resource_type, resource_id) pairs from this worker's caches.
+    """
+
+    response_cache = app.extensions["response_cache"]
+    if include_shared or not response_cache.shared:
+        response_cache.invalidate_tags(resources)
+    user_facts_cache = app.extensions["user_facts_cache"]
+    if include_shared or not user_facts_cache.shared:
+        user_facts_cache.delete_many(
+            resource_id
+            for resource_type, resource_id in resources
+            if resource_type == "users"
+        )
+    missing_resources_cache = app.extensions["missing_resources_cache"]
+    if include_shared or not missing_resources_cache.shared:
+        missing_resources_cache.delete_many(resources)
+
+
+def clear_local_caches(app):
+    for name in ("response_cache", "user_facts_cache", "missing_resources_cache"):
+        if not app.extensions[name].shared:
+            app.extensions[name].clear()
+
+
+@event.listens_for(SignallingSession, "before_commit")
+def _publish_stale_resources(session):
+    stale_resources = sorted(session.info.get("stale_resources", ()))
+    if not stale_resources or not has_app_context():
+        return
+    channel = current_app.config["CACHE_INVALIDATION_CHANNEL"]
+    origin = current_app.extensions["invalidation_origin"]
+    for start in range(0, len(stale_resources), MAX_RESOURCES_PER_NOTIFICATION):
+        payload = json.dumps(
+            dict(
+                origin=origin,
+                resources=stale_resources[
+                    start : start + MAX_RESOURCES_PER_NOTIFICATION
+                ],
+            )
+        )
+        session.execute(func.pg_notify(channel, payload).select())
+
+
+@event.listens_for(SignallingSession, "after_commit")
+def _invalidate_stale_resources(session):
+    stale_resources = session.info.pop("stale_resources", None)
+    if stale_resources and has_app_context():
+        invalidate_locally(current_app, stale_resources)
+
+
+@event.listens_for(SignallingSession, "after_rollback")
+def _forget_stale_resources(session):
+    session.info.pop("stale_resources", None)
+
+
+class InvalidationListener(threading.Thread):
+    """
+    Listens for invalidations published by other workers. The listener holds its own connection
+    rather than one from the application's pool, made directly to Postgres since LISTEN doesn't work
+    through a transaction pooler such as PgBouncer. Notifications sent while the connection is down
+    are lost, so every time the listener (re)connects it clears this worker's caches entirely.
+    """
+
+    poll_interval = 1
+    reconnect_interval = 5
+
+    def __init__(self, app):
+        super().__init__(name="invalidation-listener", daemon=True)
+        self.app = app
+        self._stopped = threading.Event()
+        self.listening = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                self._listen()
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception("Cache invalidation listener disconnected")
+                self._stopped.wait(self.reconnect_interval)
+
+    def _listen(self):
+        engine = create_engine(
+            self.app.config["SQLALCHEMY_DIRECT_DATABASE_URI"], poolclass=NullPool
+        )
+        connection = engine.raw_connection()
+        try:
+            dbapi_connection = connection.connection
+            dbapi_connection.autocommit = True
+            with dbapi_connection.cursor() as cursor:
+                cursor.execute(
+                    f'LISTEN "{self.app.config["CACHE_INVALIDATION_CHANNEL"]}"'
+                )
+            clear_local_caches(self.app)
+            self.listening.set()
+            while not self._stopped.is_set():
+                if select.select([dbapi_connection], [], [], self.poll_interval)[0]:
+                    dbapi_connection.poll()
+                    while dbapi_connection.notifies:
+                        self._handle(dbapi_connection.notifies.pop(0).payload)
+        finally:
+            self.listening.clear()
+            connection.close()
+
+    def _handle(self, payload):
+        message = json.loads(payload)
+        if message["origin"] != self.app.extensions["invalidation_origin"]:
+            invalidate_locally(
+                self.app,
+                [tuple(resource) for resource in message["resources"]],
+                include_shared=False,
+            )
@@ -0,0 +1,56 @@
+"""
+A connection pool which keeps count of how long requests wait to check out a connection, so that
+pool sizes can be tuned against Postgres' max_connections (every worker process has its own pool,
+so the sum of pool_size + max_overflow across workers must fit within it).
+"""
+
+import threading
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+class MeteredQueuePool(QueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._checkouts = 0
+        self._checkout_seconds = 0.0
+        self._checkout_timeouts = 0
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            with self._stats_lock:
+                self._checkout_timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started_at
+            with self._stats_lock:
+                self._checkouts += 1
+                self._checkout_seconds += waited
+
+    def stats(self):
+        """
+        Returns the number of checkouts and the total time spent waiting for them, the number of
+        checkouts which timed out, and the pool's current size, connections in use, and overflow
+        (connections opened beyond pool_size, which is negative while the pool isn't yet full).
+        """
+
+        with self._stats_lock:
+            checkouts, checkout_seconds, checkout_timeouts = (
+                self._checkouts,
+                self._checkout_seconds,
+                self._checkout_timeouts,
+            )
+        return dict(
+            checkouts=checkouts,
+            checkout_seconds=checkout_seconds,
+            checkout_timeouts=checkout_timeouts,
+            size=self.size(),
+            checked_out=self.checkedout(),
+            overflow=self.overflow(),
+        )
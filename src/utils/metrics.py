@@ -0,0 +1,58 @@
+"""
+A minimal in-process metrics registry, rendered in the Prometheus text exposition format at
+/metrics. Each worker process keeps its own metrics, so they should be scraped per worker (or
+summed across workers by the scraper).
+"""
+
+import threading
+from collections import defaultdict
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in labels
+    )
+    return f"{{{pairs}}}"
+
+
+class Metrics:
+    """
+    Records summaries (a count and sum of observed values) and reports values gathered by
+    collectors, callables which return (name, labels dict, value) tuples when the metrics are
+    rendered.
+    """
+
+    def __init__(self):
+        self._summaries = defaultdict(lambda: [0, 0.0])
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            summary = self._summaries[key]
+            summary[0] += 1
+            summary[1] += value
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        with self._lock:
+            summaries = sorted(
+                (key, tuple(summary)) for key, summary in self._summaries.items()
+            )
+        lines = []
+        for (name, labels), (count, total) in summaries:
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                if value is not None:
+                    lines.append(
+                        f"{name}{_format_labels(sorted(labels.items()))} {value}"
+                    )
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,56 @@
+"""
+Bcrypt password hashing and verification. Bcrypt is deliberately CPU intensive, so the work is
+run on a bounded pool of threads (bcrypt releases the GIL while hashing) rather than directly on
+the request thread. Once every worker is busy and the queue of waiting operations is full, further
+operations are rejected with a ServiceUnavailableError instead of piling up behind the others.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from ..exceptions import ServiceUnavailableError
+
+
+def get_rounds(password_hash):
+    # bcrypt hashes have the form $<version>$<rounds>$<salt and digest>
+    return int(password_hash.split("$")[2])
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode(
+        "utf-8"
+    )
+
+
+def _verify(password, password_hash):
+    return bcrypt.checkpw(password.encode("utf-8"), password_hash.encode("utf-8"))
+
+
+class PasswordHasher:
+    def __init__(self, rounds, max_workers, max_pending):
+        self.rounds = rounds
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="bcrypt"
+        )
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+
+    def hash(self, password):
+        return self._run(_hash, password, self.rounds)
+
+    def verify(self, password, password_hash):
+        return self._run(_verify, password, password_hash)
+
+    def needs_rehash(self, password_hash):
+        return get_rounds(password_hash) != self.rounds
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            raise ServiceUnavailableError(
+                "Too many password operations are in progress, please try again shortly"
+            )
+        try:
+            return self._executor.submit(func, *args).result()
+        finally:
+            self._slots.release()
@@ -0,0 +1,180 @@
+"""
+Declarative request handling for controller methods. Rather than stacking decorators in whatever
+order seems right for each method, a method declares what its requests need and the pipeline runs
+those stages in a fixed order, cheapest first, so that a request which is going to fail does as
+little work as possible:
+
+1. validate: checks which only look at the request itself, such as its headers
+2. throttle: rate limits
+3. auth: verifying the request's JWT and loading the current user
+4. authorize: checks of the current user against the request's path parameters
+5. load: skipping known-missing resources, the response cache, conditional GETs (which a cache hit
+   answers itself), and loading the requested resource
+6. authorize_resource: checks of the current user against the loaded resource
+7. serialize (around the handler): formatting the handler's result as a JSON:API document
+
+Any stage may end the request early, by raising an APIError or returning a response. Before any
+stage runs, the request's query budget (see utils/query_budgets.py) is applied.
+
+GET requests only read, so their transactions are made read only, and the session doesn't
+autoflush while handling them. Their transaction is ended as soon as the response has been
+serialized, returning its connection to the pool rather than holding it until the request is torn
+down.
+
+The time spent in each stage, and in the handler itself, is recorded in the metrics registry as the
+`request_stage_seconds` summary, labelled by endpoint and stage.
+"""
+
+import contextlib
+import functools
+import time
+from collections import defaultdict
+
+from flask import current_app, g, request
+from flask_jwt_extended import jwt_refresh_token_required, jwt_required
+
+from ..db import DB
+from .controller_decorators import (
+    cache_response,
+    call_before,
+    conditional_get,
+    format_response,
+    get_resource,
+    rate_limit,
+    reject_known_missing,
+)
+from .query_budgets import query_budget, read_only_transactions
+
+_AUTHENTICATORS = dict(access=jwt_required, refresh=jwt_refresh_token_required)
+
+
+class StageTimer:
+    """
+    Attributes elapsed time to whichever stage is currently running. Stages are nested (each wraps
+    the rest of the pipeline), so switching stages on the way in and back on the way out gives each
+    stage only the time spent in its own code.
+    """
+
+    def __init__(self):
+        self.durations = defaultdict(float)
+        self._stage = None
+        self._started_at = time.perf_counter()
+
+    def switch(self, stage):
+        now = time.perf_counter()
+        if self._stage is not None:
+            self.durations[self._stage] += now - self._started_at
+        previous, self._stage, self._started_at = self._stage, stage, now
+        return previous
+
+
+def _timed(stage, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        previous = g.stage_timer.switch(stage)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            g.stage_timer.switch(previous)
+
+    return wrapper
+
+
+# each argument configures one stage, and they're keyword only, so there's no ordering to get wrong
+def pipeline(  # pylint: disable=too-many-arguments
+    *,
+    budget=None,
+    validate=(),
+    rate_limits=(),
+    auth=None,
+    authorize=(),
+    load=None,
+    fingerprint=None,
+    cache=False,
+    authorize_resource=(),
+    serialize=None,
+):
+    """
+    Parameters
+    ----------
+    budget (str): the name of the query budget which limits the request's database work
+    validate (callable[]): callbacks which raise an APIError if the request is invalid
+    rate_limits ((str, callable)[]): the names and key callbacks of rate limits to consume from
+      (see utils/rate_limiter.py)
+    auth (str): the type of JWT required, "access" or "refresh", if any
+    authorize (callable[]): callbacks which raise an APIError if the current user may not make the
+      request, given its path parameters
+    load (Model): the model of the resource identified by the request's path, which is passed to
+      the handler in place of its ID
+    fingerprint (callable): fingerprints the requested resource(s), to support conditional GETs
+      (see utils/fingerprints.py)
+    cache (bool): whether to serve the loaded resource's responses from the response cache
+    authorize_resource (callable[]): callbacks which receive the loaded resource and raise an
+      APIError if the current user may not make the request
+    serialize (dict): a format_response configuration for the handler's result
+
+    Example
+    -------
+    @pipeline(
+        budget="write",
+        validate=[validate_accept_header],
+        auth="access",
+        load=Team,
+        authorize_resource=[validate_permissions],
+        serialize={"name": "teams", "marshaller": Team.marshaller.omit("id")},
+    )
+    def patch(self, team):
+        ...
+    """
+
+    stages = [
+        ("validate", [call_before(validate)] if validate else []),
+        ("throttle", [rate_limit(name, key) for name, key in rate_limits]),
+        ("auth", [_AUTHENTICATORS[auth]] if auth else []),
+        ("authorize", [call_before(authorize)] if authorize else []),
+        (
+            "load",
+            ([reject_known_missing(load)] if load else [])
+            + ([cache_response(load)] if cache else [])
+            + ([conditional_get(fingerprint)] if fingerprint else [])
+            + ([get_resource(load)] if load else []),
+        ),
+        (
+            "authorize_resource",
+            [call_before(authorize_resource)] if authorize_resource else [],
+        ),
+        ("serialize", [format_response(serialize)] if serialize else []),
+    ]
+
+    def decorator(func):
+        handler = _timed("handler", func)
+        for stage, decorators in reversed(stages):
+            for stage_decorator in reversed(decorators):
+                handler = _timed(stage, stage_decorator(handler))
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            read_only = request.method in ("GET", "HEAD")
+            timer = g.stage_timer = StageTimer()
+            try:
+                with contextlib.ExitStack() as stack:
+                    if budget is not None:
+                        stack.enter_context(query_budget(budget))
+                    if read_only:
+                        stack.enter_context(read_only_transactions())
+                        stack.enter_context(DB.session.no_autoflush)
+                    return handler(*args, **kwargs)
+            finally:
+                timer.switch(None)
+                metrics = current_app.extensions["metrics"]
+                for stage, duration in timer.durations.items():
+                    metrics.observe(
+                        "request_stage_seconds",
+                        duration,
+                        endpoint=request.endpoint,
+                        stage=stage,
+                    )
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,113 @@
+"""
+Deletion of users and teams. Team memberships are removed by the database's ON DELETE CASCADE
+rather than being loaded and deleted through the ORM. Resources with a large number of
+memberships are instead soft-deleted (marked inactive) and purged in chunks on a background
+thread, so that the request which deleted them can return immediately.
+
+References to a deleted resource which are declared ON DELETE SET NULL (such as the teams a user
+created) are nulled here rather than by the database, which wouldn't bump the rows' updated_at,
+leaving the fragment cache and conditional GETs (see utils/fingerprints.py) unaware of the change.
+"""
+
+from collections import defaultdict
+
+from flask import current_app
+from sqlalchemy import case, func, or_, select
+
+from ..db import DB
+from ..models import TeamMembership
+from .invalidation import mark_stale
+
+
+def delete_resource(resource, membership_column):
+    """
+    Deletes a user or team. `membership_column` is the TeamMembership column which references the
+    resource, e.g. TeamMembership.user_id when deleting a user.
+    """
+
+    _clear_references(resource)
+    membership_count = TeamMembership.query.filter(
+        membership_column == resource.id
+    ).count()
+    if membership_count <= current_app.config["PURGE_IN_BACKGROUND_THRESHOLD"]:
+        DB.session.delete(resource)
+        DB.session.commit()
+        return None
+
+    resource.is_active = False
+    DB.session.add(resource)
+    DB.session.commit()
+    return current_app.extensions["purge_executor"].submit(
+        _purge_in_app_context,
+        current_app._get_current_object(),  # pylint: disable=protected-access
+        type(resource),
+        resource.id,
+        membership_column,
+    )
+
+
+def purge(model, resource_id, membership_column, chunk_size):
+    """
+    Deletes the resource's team memberships in chunks of `chunk_size`, committing after each one
+    so that no single transaction holds locks on all of them, and then deletes the resource itself.
+    """
+
+    memberships = TeamMembership.__table__
+    while True:
+        chunk = (
+            select([memberships.c.id])
+            .where(memberships.c[membership_column.key] == resource_id)
+            .limit(chunk_size)
+        )
+        deleted = DB.session.execute(
+            memberships.delete()
+            .where(memberships.c.id.in_(chunk))
+            .returning(memberships.c.user_id, memberships.c.team_id)
+        ).fetchall()
+        mark_stale("users", *(user_id for user_id, _ in deleted))
+        mark_stale("teams", *(team_id for _, team_id in deleted))
+        DB.session.commit()
+        if len(deleted) < chunk_size:
+            break
+    model.query.filter_by(id=resource_id).delete(synchronize_session=False)
+    DB.session.commit()
+
+
+def _purge_in_app_context(app, model, resource_id, membership_column):
+    with app.app_context():
+        purge(model, resource_id, membership_column, app.config["PURGE_CHUNK_SIZE"])
+
+
+def _clear_references(resource):
+    references = defaultdict(list)
+    for table in DB.metadata.sorted_tables:
+        for foreign_key in table.foreign_keys:
+            if (
+                foreign_key.ondelete == "SET NULL"
+                and foreign_key.column.table is resource.__table__
+            ):
+                references[table].append(foreign_key.parent)
+    for table, columns in references.items():
+        owners = [
+            foreign_key
+            for foreign_key in table.foreign_keys
+            if foreign_key.ondelete == "CASCADE"
+        ]
+        updated = DB.session.execute(
+            table.update()
+            .where(or_(*(column == resource.id for column in columns)))
+            .values(
+                updated_at=func.now(),
+                **{
+                    column.key: case([(column == resource.id, None)], else_=column)
+                    for column in columns
+                },
+            )
+            .returning(table.c.id, *(owner.parent for owner in owners))
+        ).fetchall()
+        mark_stale(table.name, *(row.id for row in updated))
+        # cached responses are tagged with the resources rows belong to, e.g. a membership's team
+        for owner in owners:
+            mark_stale(
+                owner.column.table.name, *(row[owner.parent.key] for row in updated)
+            )
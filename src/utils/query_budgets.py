@@ -0,0 +1,115 @@
+"""
+Limits on how long a request may spend in the database, so that a single slow request can't hold
+on to a connection (and starve the pool) indefinitely. Controller methods name the budget which
+suits them (see utils/pipeline.py), and every transaction begun while handling the request sets
+the budget's statement_timeout and idle_in_transaction_session_timeout as if by `SET LOCAL`, so
+that they last only until the transaction ends (which also makes them safe to use through
+PgBouncer).
+
+A statement which exceeds its timeout is cancelled, and the request fails with a 504 error. A
+transaction left idle for too long has its connection terminated by Postgres, and the request which
+next tries to use it fails with a 503 error.
+
+Requests which only read (GET requests, see utils/pipeline.py) also make their transactions read
+only, in the same round trip as setting their timeouts.
+"""
+
+import contextlib
+from collections import namedtuple
+
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy import SignallingSession
+from sqlalchemy import event, func, select
+
+from ..db import DB
+from ..exceptions import GatewayTimeoutError, ServiceUnavailableError
+
+QueryBudget = namedtuple(
+    "QueryBudget", ["statement_timeout", "idle_in_transaction_timeout"]
+)
+
+# the SQLSTATE of statements cancelled due to statement_timeout
+QUERY_CANCELED = "57014"
+
+_BUDGET_KEY = "marathon.query_budget"
+_READ_ONLY_KEY = "marathon.read_only"
+
+
+def parse_budget(budget):
+    """
+    Parses a budget of the form "<statement timeout>/<idle in transaction timeout>", each in
+    milliseconds, e.g. "2000/10000", into a QueryBudget.
+    """
+
+    statement_timeout, idle_in_transaction_timeout = budget.split("/")
+    return QueryBudget(int(statement_timeout), int(idle_in_transaction_timeout))
+
+
+@contextlib.contextmanager
+def query_budget(name):
+    """
+    Applies the named budget to the current request's transactions begun within the block.
+    """
+
+    request.environ[_BUDGET_KEY] = current_app.config["QUERY_BUDGETS"][name]
+    try:
+        yield
+    finally:
+        request.environ.pop(_BUDGET_KEY, None)
+
+
+@contextlib.contextmanager
+def read_only_transactions():
+    """
+    Makes the current request's transactions begun within the block read only, and ends them when
+    the block exits so that their connections are returned to the pool straight away.
+    """
+
+    request.environ[_READ_ONLY_KEY] = True
+    try:
+        yield
+    finally:
+        request.environ.pop(_READ_ONLY_KEY, None)
+        if DB.session.info.pop("read_only", False):
+            DB.session.rollback()
+
+
+def to_api_error(error):
+    """
+    Returns the APIError for a SQLAlchemy OperationalError caused by a query budget being exceeded,
+    or None if it wasn't.
+    """
+
+    if getattr(error.orig, "pgcode", None) == QUERY_CANCELED:
+        return GatewayTimeoutError()
+    if error.connection_invalidated:
+        return ServiceUnavailableError(
+            "The requested operation could not be completed because its database connection "
+            "was lost"
+        )
+    return None
+
+
+@event.listens_for(SignallingSession, "after_begin")
+def _configure_transaction(session, transaction, connection):
+    # pylint: disable=unused-argument
+    if not has_request_context():
+        return
+    settings = []
+    budget = request.environ.get(_BUDGET_KEY)
+    if budget is not None:
+        settings.append(("statement_timeout", str(budget.statement_timeout)))
+        settings.append(
+            (
+                "idle_in_transaction_session_timeout",
+                str(budget.idle_in_transaction_timeout),
+            )
+        )
+    if request.environ.get(_READ_ONLY_KEY):
+        settings.append(("transaction_read_only", "on"))
+        session.info["read_only"] = True
+    if settings:
+        # set_config's third argument makes the settings local to the transaction
+        connection.execute(
+            select([func.set_config(name, value, True) for name, value in settings])
+        )
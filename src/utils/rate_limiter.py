@@ -0,0 +1,131 @@
+"""
+Token bucket rate limiting for controller methods. Each named limit describes how many requests a
+single client may burst (the bucket's capacity) and the period over which that many tokens are
+refilled.
+
+Buckets are kept by a backend. The memory backend only enforces limits within a single worker
+process; the database backend keeps buckets in Postgres, so that limits hold across every worker
+and node.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from flask import request
+from sqlalchemy import text
+
+from ..db import DB
+from ..exceptions import TooManyRequestsError
+
+
+def parse_limit(limit):
+    """
+    Parses a limit of the form "<requests>/<seconds>", e.g. "30/60" for 30 requests per minute,
+    into a (capacity, period) tuple.
+    """
+
+    capacity, period = limit.split("/")
+    return int(capacity), float(period)
+
+
+def client_ip(*args, **kwargs):
+    return request.remote_addr
+
+
+def submitted_username(*args, **kwargs):
+    return request.form.get("username", "")
+
+
+class MemoryBackend:
+    """
+    Keeps token buckets in the memory of the current process. The number of buckets is bounded so
+    that a flood of distinct keys cannot grow memory without limit; the least recently used bucket
+    is dropped first.
+    """
+
+    def __init__(self, max_buckets=10000):
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_buckets = max_buckets
+
+    def consume(self, key, capacity, period):
+        now = time.monotonic()
+        with self._lock:
+            tokens, last_refill = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - last_refill) * capacity / period)
+            allowed = tokens >= 1
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+            if len(self._buckets) > self._max_buckets:
+                self._buckets.popitem(last=False)
+        return allowed
+
+    def prune(self, max_age):
+        cutoff = time.monotonic() - max_age
+        with self._lock:
+            for key in [k for k, (_, t) in self._buckets.items() if t < cutoff]:
+                del self._buckets[key]
+
+
+class DatabaseBackend:
+    """
+    Keeps token buckets in the rate_limit_buckets table. Each request is a single upsert, run in
+    its own transaction on the database's clock, which refills the bucket and takes a token if one
+    is available.
+    """
+
+    _consume = text(
+        """
+        INSERT INTO rate_limit_buckets (key, tokens, allowed, refilled_at)
+        VALUES (:key, :capacity - 1, true, now())
+        ON CONFLICT (key) DO UPDATE SET
+            tokens = CASE
+                WHEN {refilled} >= 1 THEN {refilled} - 1
+                ELSE {refilled}
+            END,
+            allowed = {refilled} >= 1,
+            refilled_at = now()
+        RETURNING allowed
+        """.format(
+            refilled=(
+                "LEAST(:capacity, rate_limit_buckets.tokens + EXTRACT(EPOCH FROM "
+                "now() - rate_limit_buckets.refilled_at) * :capacity / :period)"
+            )
+        )
+    )
+    _prune = text(
+        "DELETE FROM rate_limit_buckets "
+        "WHERE refilled_at < now() - :max_age * interval '1 second'"
+    )
+
+    def consume(self, key, capacity, period):
+        with DB.engine.begin() as connection:
+            return connection.execute(
+                self._consume, key=key, capacity=capacity, period=period
+            ).scalar()
+
+    def prune(self, max_age):
+        with DB.engine.begin() as connection:
+            connection.execute(self._prune, max_age=max_age)
+
+
+BACKENDS = dict(memory=MemoryBackend, database=DatabaseBackend)
+
+
+class RateLimiter:
+    def __init__(self, backend, limits):
+        self.backend = backend
+        self.limits = limits
+
+    def consume(self, name, key):
+        capacity, period = self.limits[name]
+        if not self.backend.consume(f"{name}:{key}", capacity, period):
+            raise TooManyRequestsError()
+
+    def prune(self):
+        """
+        Discards buckets which have not been used for longer than the longest period, as they
+        would have refilled completely by now anyway.
+        """
+
+        self.backend.prune(max(period for _, period in self.limits.values()))
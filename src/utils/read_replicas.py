@@ -0,0 +1,107 @@
+"""
+Routing of reads to Postgres read replicas. When replicas are configured (as the SQLAlchemy binds
+named in READ_REPLICA_BINDS), each GET request is assigned one at random, and the session sends
+its queries there rather than to the primary. Everything else, including any flush, goes to the
+primary.
+
+Replicas lag slightly behind the primary, so a client which has just written would otherwise risk
+not seeing its own write. Any request which commits a transaction therefore sets a cookie which
+keeps that client's requests on the primary for READ_REPLICA_STICKY_SECONDS.
+
+Data which is cached until it is invalidated (see utils/invalidation.py) must not be read from a
+replica, or a read made just after an invalidation could cache the data from before the change.
+Code which fills such caches reads from the primary with `reading_from_primary`.
+"""
+
+import contextlib
+import random
+import time
+
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy import SignallingSession
+from sqlalchemy import event
+
+STICKY_COOKIE = "read_from_primary_until"
+
+_REPLICA_KEY = "marathon.read_replica"
+_COMMITTED_KEY = "marathon.committed"
+
+
+class RoutingSession(SignallingSession):
+    def __init__(self, extension, **options):
+        super().__init__(extension, **options)
+        self.extension = extension
+
+    def get_bind(self, mapper=None, clause=None):
+        replica = current_replica()
+        if replica is not None and not self._flushing:
+            return self.extension.get_engine(self.app, bind=replica)
+        return super().get_bind(mapper, clause)
+
+
+def current_replica():
+    """
+    Returns the bind name of the replica which the current request reads from, or None if it reads
+    from the primary.
+    """
+
+    if not has_request_context():
+        return None
+    return request.environ.get(_REPLICA_KEY)
+
+
+@contextlib.contextmanager
+def reading_from_primary():
+    """
+    Sends the current request's queries to the primary within the block.
+    """
+
+    if not has_request_context():
+        yield
+        return
+    replica = request.environ.pop(_REPLICA_KEY, None)
+    try:
+        yield
+    finally:
+        if replica is not None:
+            request.environ[_REPLICA_KEY] = replica
+
+
+def choose_replica():
+    """
+    Assigns the current request a replica to read from, if it's a GET request from a client which
+    hasn't written recently.
+    """
+
+    replicas = current_app.config["READ_REPLICA_BINDS"]
+    if not replicas or request.method not in ("GET", "HEAD"):
+        return
+    try:
+        sticky_until = float(request.cookies.get(STICKY_COOKIE, 0))
+    except ValueError:
+        sticky_until = 0
+    if sticky_until <= time.time():
+        request.environ[_REPLICA_KEY] = random.choice(replicas)
+
+
+def stick_to_primary(response):
+    """
+    Keeps the client on the primary for a while if the current request committed a write.
+    """
+
+    if request.environ.get(_COMMITTED_KEY) and current_app.config["READ_REPLICA_BINDS"]:
+        sticky_seconds = current_app.config["READ_REPLICA_STICKY_SECONDS"]
+        response.set_cookie(
+            STICKY_COOKIE,
+            str(time.time() + sticky_seconds),
+            max_age=sticky_seconds,
+            httponly=True,
+        )
+    return response
+
+
+@event.listens_for(SignallingSession, "after_commit")
+def _record_commit(session):
+    # pylint: disable=unused-argument
+    if has_request_context():
+        request.environ[_COMMITTED_KEY] = True
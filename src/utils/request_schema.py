@@ -0,0 +1,105 @@
+"""
+Parsing and validation of request arguments. Controllers declare a RequestSchema for each method
+which takes arguments once, at import time, rather than building a flask-restful RequestParser for
+every request. Each problem with a request is reported as its own JSON:API error object, whose
+source points at the offending argument.
+"""
+
+from collections import namedtuple
+
+from flask import request
+
+from ..exceptions import BadRequestError, BadRequestErrors
+
+Field = namedtuple("Field", ["required", "nullable", "many"], defaults=[False] * 3)
+
+_SCALAR_TYPES = (str, int, float, bool)
+
+
+class RequestSchema:
+    """
+    Describes the arguments expected in one location of a request: "json" (the JSON body), "form"
+    (a form encoded body) or "args" (the query string). Argument values are strings, or lists of
+    strings for fields with `many` set; arguments which are omitted are None.
+
+    Example
+    -------
+    TEAM_SCHEMA = RequestSchema("json", name=Field(required=True), team_members=Field(many=True))
+    """
+
+    _descriptions = dict(
+        json="the JSON body", form="the post body", args="the query string"
+    )
+
+    def __init__(self, location, **fields):
+        self.location = location
+        self.fields = tuple(fields.items())
+        self._missing_message = (
+            f"Missing required parameter in {self._descriptions[location]}"
+        )
+
+    def parse(self):
+        """
+        Returns a dict of the request's arguments, raising BadRequestErrors listing every invalid
+        argument if there are any.
+        """
+
+        source = self._get_source()
+        args = {}
+        errors = []
+        for name, field in self.fields:
+            try:
+                args[name] = self._parse_field(source, name, field)
+            except BadRequestError as error:
+                errors.append(error)
+        if errors:
+            raise BadRequestErrors(errors)
+        return args
+
+    def _get_source(self):
+        if self.location == "form":
+            return request.form
+        if self.location == "args":
+            return request.args
+        body = request.get_json(silent=True)
+        if body is None and request.get_data():
+            raise BadRequestError("The request body is not valid JSON")
+        if body is not None and not isinstance(body, dict):
+            raise BadRequestError(
+                "The request body must be a JSON object", source={"pointer": ""}
+            )
+        return body or {}
+
+    def _parse_field(self, source, name, field):
+        if name not in source:
+            if field.required:
+                raise BadRequestError(self._missing_message, source=self._source(name))
+            return None
+        if self.location != "json":
+            return source.getlist(name) if field.many else source.get(name)
+        value = source[name]
+        if value is None:
+            if field.nullable:
+                return None
+            raise BadRequestError("Must not be null", source=self._source(name))
+        if field.many and isinstance(value, list):
+            if not value and field.required:
+                raise BadRequestError(self._missing_message, source=self._source(name))
+            return [
+                self._parse_value(item, f"{name}/{i}") for i, item in enumerate(value)
+            ]
+        return (
+            [self._parse_value(value, name)]
+            if field.many
+            else self._parse_value(value, name)
+        )
+
+    def _parse_value(self, value, path):
+        if not isinstance(value, _SCALAR_TYPES):
+            raise BadRequestError("Must be a string", source=self._source(path))
+        return value if isinstance(value, str) else str(value)
+
+    def _source(self, path):
+        if self.location == "json":
+            return {"pointer": f"/{path}"}
+        return {"parameter": path}
@@ -0,0 +1,48 @@
+"""
+URL converters used when routing requests. Because they run while the request is being routed,
+malformed path parameters are rejected before any authentication or database work is done.
+"""
+
+import re
+
+from werkzeug.exceptions import BadRequest
+from werkzeug.routing import BaseConverter
+
+from ..exceptions import BadRequestError
+
+# the canonical form of a version 4 UUID, as accepted by utils/is_valid_uuid.py
+UUID4_PATTERN = re.compile(
+    r"[0-9a-f]{8}-[0-9a-f]{4}-4[0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}"
+)
+
+
+class InvalidPathParameter(BadRequest):
+    """
+    Raised while routing a request with an invalid path parameter. Werkzeug only lets HTTP
+    exceptions escape from routing, so this wraps the JSON:API error to be returned.
+    """
+
+    def __init__(self, error):
+        super().__init__(error.message)
+        self.error = error
+
+
+class ResourceIDConverter(BaseConverter):
+    """
+    Matches the ID of a resource, given the resource's name, e.g.
+
+        /teams/<resource_id("Team"):team_id>
+
+    Any path segment is matched, so that malformed IDs get a 400 response rather than a 404.
+    """
+
+    def __init__(self, url_map, resource_name):
+        super().__init__(url_map)
+        self.resource_name = resource_name
+
+    def to_python(self, value):
+        if not UUID4_PATTERN.fullmatch(value):
+            raise InvalidPathParameter(
+                BadRequestError(f"{self.resource_name} ID {value} is not a valid UUID")
+            )
+        return value
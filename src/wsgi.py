@@ -0,0 +1,19 @@
+"""
+The WSGI entry point used by production servers, e.g. `gunicorn src.wsgi:app`, which takes its
+settings from gunicorn.conf.py. `python -m src.app` runs the development server instead.
+"""
+
+from .app import create_app
+from .db import DB
+
+app = create_app()
+
+
+def dispose_engines():
+    """
+    Closes the connections in the app's pools (the primary's and each replica's), so that any
+    process forked afterwards opens its own rather than sharing them.
+    """
+
+    for bind in [None, *app.config["READ_REPLICA_BINDS"]]:
+        DB.get_engine(app, bind=bind).dispose()
@@ -1,14 +1,32 @@
+import contextlib
+
+from flask_migrate import upgrade
 import pytest
 
 from src.app import create_app
 from src.db import DB
 from src.models import User, Team
+from src.utils.cache import create_cache
+from .utils import LocalRedisServer
+
+
+@pytest.fixture(name="migrated_database", scope="session")
+def migrated_database_fixture():
+    """
+    Migrates the test database once per run, which creates the extensions that the models rely on.
+    Each test then creates (and drops) the tables themselves.
+    """
+
+    with create_app(db_name="marathon_test").app_context():
+        upgrade()
 
 
 @pytest.fixture(name="app")
-def app_fixture():
+def app_fixture(migrated_database):
+    # pylint: disable=unused-argument
     app = create_app(db_name="marathon_test")
     app.config["TESTING"] = True
+    app.config["CACHE_INVALIDATION_LISTENER"] = False
     with app.app_context():
         DB.create_all()
         yield app
@@ -16,6 +34,30 @@ def app_fixture():
         DB.drop_all()
 
 
+@pytest.fixture
+def cache_backend(request, app, tmp_path):
+    """
+    Replaces the app's caches with ones using the backend given by the test's parameter, e.g.
+    @pytest.mark.parametrize("cache_backend", ["memory", "redis"], indirect=True)
+    """
+
+    with contextlib.ExitStack() as stack:
+        app.config["CACHE_BACKEND"] = request.param
+        if request.param == "shared_memory":
+            app.config["CACHE_URL"] = str(tmp_path)
+        elif request.param == "redis":
+            app.config["CACHE_URL"] = stack.enter_context(LocalRedisServer()).url
+        app.extensions["user_facts_cache"] = create_cache(
+            app, "user_facts", ttl=app.config["USER_CACHE_TTL"]
+        )
+        app.extensions["response_cache"] = create_cache(app, "responses")
+        app.extensions["fragment_cache"] = create_cache(app, "fragments")
+        app.extensions["missing_resources_cache"] = create_cache(
+            app, "missing_resources"
+        )
+        yield request.param
+
+
 @pytest.fixture
 def client(app):
     with app.test_client() as test_client:
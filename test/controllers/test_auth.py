@@ -1,7 +1,14 @@
 import json
 import pytest
 
-from src.exceptions import BadRequestError
+from src.exceptions import (
+    BadRequestError,
+    ServiceUnavailableError,
+    TooManyRequestsError,
+)
+from src.models import RateLimitBucket, User
+from src.utils.password_hasher import get_rounds
+from src.utils.rate_limiter import DatabaseBackend
 from .utils import get_content_type
 
 # pylint: disable=invalid-name
@@ -14,21 +21,9 @@ pytestmark = [
 @pytest.mark.parametrize(
     "test_input,expected",
     [
-        (
-            dict(),
-            dict(
-                username="Missing required parameter in the post body",
-                password="Missing required parameter in the post body",
-            ),
-        ),
-        (
-            dict(username="username"),
-            dict(password="Missing required parameter in the post body"),
-        ),
-        (
-            dict(password="password"),
-            dict(username="Missing required parameter in the post body"),
-        ),
+        (dict(), ["username", "password"]),
+        (dict(username="username"), ["password"]),
+        (dict(password="password"), ["username"]),
     ],
 )
 def test_auth_post_missing_arguments(client, test_input, expected):
@@ -40,7 +35,15 @@ def test_auth_post_missing_arguments(client, test_input, expected):
     response = client.post("/auth", data=test_input)
     assert get_content_type(response) == "application/vnd.api+json"
     assert response.status_code == 400
-    assert json.loads(response.data.decode()) == dict(message=expected)
+    assert json.loads(response.data.decode()) == dict(
+        errors=[
+            BadRequestError(
+                "Missing required parameter in the post body",
+                source={"parameter": parameter},
+            ).to_dict()
+            for parameter in expected
+        ]
+    )
 
 
 def test_auth_post_nonexistent_user(client):
@@ -88,3 +91,106 @@ def test_auth_post_success(client, user1):
     assert response.status_code == 200
     assert get_content_type(response) == "application/vnd.api+json"
     assert json.loads(response.data.decode())["data"]["access_token"] is not None
+    assert json.loads(response.data.decode())["data"]["refresh_token"] is not None
+
+
+def test_auth_post_rehashes_password(app, client, user1):
+    """
+    GIVEN a pre-existing user whose password was hashed with a different cost factor than the one
+    currently configured
+    WHEN a post request is made to the `/auth` endpoint with the correct credentials for that user
+    THEN the response should have a 200 status code and the password should be rehashed with the
+    configured cost factor
+    """
+
+    app.extensions["password_hasher"].rounds = 4
+    response = client.post(
+        "/auth", data=dict(username=user1.username, password="password")
+    )
+
+    assert response.status_code == 200
+    user = User.query.filter_by(id=user1.id).first()
+    assert get_rounds(user.password_hash) == 4
+    assert user.has_password("password")
+
+
+def test_auth_post_hasher_saturated(app, client, user1):
+    """
+    GIVEN a pre-existing user
+    WHEN a post request is made to the `/auth` endpoint while the password hashing pool is
+    saturated
+    THEN the response should have a 503 status code and indicate that the server is overloaded
+    """
+
+    # pylint: disable=protected-access
+    slots = app.extensions["password_hasher"]._slots
+    acquired = 0
+    while slots.acquire(blocking=False):
+        acquired += 1
+    try:
+        response = client.post(
+            "/auth", data=dict(username=user1.username, password="password")
+        )
+    finally:
+        for _ in range(acquired):
+            slots.release()
+
+    assert response.status_code == 503
+    assert get_content_type(response) == "application/vnd.api+json"
+    assert json.loads(response.data.decode()) == dict(
+        errors=[
+            ServiceUnavailableError(
+                "Too many password operations are in progress, please try again shortly"
+            ).to_dict()
+        ]
+    )
+
+
+@pytest.mark.parametrize("backend", [None, DatabaseBackend])
+def test_auth_post_throttled_by_username(app, client, user1, backend):
+    """
+    GIVEN a pre-existing user
+    WHEN more post requests are made to the `/auth` endpoint for that user than the per-username
+    rate limit allows
+    THEN the response should have a 429 status code, even if the credentials are correct
+    """
+
+    if backend:
+        app.extensions["rate_limiter"].backend = backend()
+    app.config["RATE_LIMITS"]["login_username"] = (1, 60)
+    response = client.post(
+        "/auth", data=dict(username=user1.username, password="wrong_password")
+    )
+    assert response.status_code == 400
+
+    response = client.post(
+        "/auth", data=dict(username=user1.username, password="password")
+    )
+    assert response.status_code == 429
+    assert get_content_type(response) == "application/vnd.api+json"
+    assert json.loads(response.data.decode()) == dict(
+        errors=[TooManyRequestsError().to_dict()]
+    )
+
+    response = client.post("/auth", data=dict(username="other", password="password"))
+    assert response.status_code == 400
+    if backend:
+        assert RateLimitBucket.query.count() == 3
+
+
+def test_auth_post_throttled_by_ip(app, client):
+    """
+    WHEN more post requests are made to the `/auth` endpoint from one client than the per-IP rate
+    limit allows
+    THEN the response should have a 429 status code, regardless of the username
+    """
+
+    app.config["RATE_LIMITS"]["login_ip"] = (2, 60)
+    for username in ("first", "second"):
+        response = client.post(
+            "/auth", data=dict(username=username, password="password")
+        )
+        assert response.status_code == 400
+
+    response = client.post("/auth", data=dict(username="third", password="password"))
+    assert response.status_code == 429
@@ -0,0 +1,111 @@
+import json
+import uuid
+from datetime import timedelta
+
+from flask_jwt_extended import create_access_token, create_refresh_token
+import pytest
+
+from src.exceptions import UnauthorizedError, UnprocessableEntityError
+from .utils import get_content_type
+
+# pylint: disable=invalid-name
+pytestmark = [
+    pytest.mark.integration,
+    pytest.mark.controllers,
+]
+
+
+def test_auth_refresh_post_without_auth(client):
+    """
+    WHEN a post request is made to `/auth/refresh` without a token in the `authorization` header
+    THEN the response should have a 401 status code and indicate that the header is missing
+    """
+
+    response = client.post("/auth/refresh")
+    assert response.status_code == 401
+    assert get_content_type(response) == "application/vnd.api+json"
+    assert json.loads(response.data.decode()) == dict(
+        errors=[UnauthorizedError("Missing Authorization Header").to_dict()]
+    )
+
+
+def test_auth_refresh_post_with_access_token(client, user1):
+    """
+    GIVEN a pre-existing user
+    WHEN a post request is made to `/auth/refresh` with an access token instead of a refresh token
+    THEN the response should have a 422 status code and indicate that only refresh tokens are
+    allowed
+    """
+
+    response = client.post(
+        "/auth/refresh",
+        headers={"Authorization": f"Bearer {create_access_token(identity=user1.id)}"},
+    )
+    assert response.status_code == 422
+    assert get_content_type(response) == "application/vnd.api+json"
+    assert json.loads(response.data.decode()) == dict(
+        errors=[UnprocessableEntityError("Only refresh tokens are allowed").to_dict()]
+    )
+
+
+def test_auth_refresh_post_expired(client, user1):
+    """
+    GIVEN a pre-existing user
+    WHEN a post request is made to `/auth/refresh` with an expired refresh token
+    THEN the response should have a 401 status code and indicate that the token has expired
+    """
+
+    token = create_refresh_token(identity=user1.id, expires_delta=timedelta(seconds=-1))
+    response = client.post(
+        "/auth/refresh", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 401
+    assert get_content_type(response) == "application/vnd.api+json"
+    assert json.loads(response.data.decode()) == dict(
+        errors=[UnauthorizedError("The refresh token has expired").to_dict()]
+    )
+
+
+def test_auth_refresh_post_nonexistent_user(client):
+    """
+    WHEN a post request is made to `/auth/refresh` with a refresh token for a user that doesn't
+    exist
+    THEN the response should have a 401 status code and indicate that the user no longer exists
+    """
+
+    user_id = str(uuid.uuid4())
+    response = client.post(
+        "/auth/refresh",
+        headers={"Authorization": f"Bearer {create_refresh_token(identity=user_id)}"},
+    )
+    assert response.status_code == 401
+    assert get_content_type(response) == "application/vnd.api+json"
+    assert json.loads(response.data.decode()) == dict(
+        errors=[UnauthorizedError(f"User {user_id} no longer exists").to_dict()]
+    )
+
+
+def test_auth_refresh_post_success(client, user1):
+    """
+    GIVEN a pre-existing user
+    WHEN a post request is made to `/auth/refresh` with a valid refresh token for that user
+    THEN the response should have a 200 status code and include a new access token which can be
+    used to access protected endpoints
+    """
+
+    response = client.post(
+        "/auth/refresh",
+        headers={"Authorization": f"Bearer {create_refresh_token(identity=user1.id)}"},
+    )
+    assert response.status_code == 200
+    assert get_content_type(response) == "application/vnd.api+json"
+    access_token = json.loads(response.data.decode())["data"]["access_token"]
+
+    response = client.get(
+        f"/users/{user1.id}",
+        headers={
+            "Accept": "application/vnd.api+json",
+            "Authorization": f"Bearer {access_token}",
+        },
+    )
+    assert response.status_code == 200
@@ -1,13 +1,20 @@
 import json
+import threading
+import time
 import uuid
 
 from flask_jwt_extended import create_access_token
+from flask_migrate import upgrade
 import pytest
+from sqlalchemy import event
+from sqlalchemy.engine.url import make_url
 
+from src.app import create_app
 from src.db import DB
 from src.exceptions import BadRequestError, ForbiddenError, NotFoundError
 from src.models import Team, TeamMembership
-from .utils import get_content_type
+from src.utils.invalidation import mark_stale
+from .utils import LocalPgBouncer, get_content_type
 
 # pylint: disable=invalid-name
 pytestmark = [
@@ -443,6 +450,46 @@ def test_team_detail_patch_success(client, user1, team1):
     }
 
 
+def test_team_detail_patch_unchanged(client, user1, team1):
+    """
+    GIVEN an existing user and team, with the authenticated user being a member of that team
+    WHEN a patch request is made to `/teams/<team_id>` with the team's current name
+    THEN the response should have a 200 status and return the team's details, without the team
+    being updated or its cached responses invalidated
+    """
+
+    team1.members.append(user1)
+    DB.session.add(team1)
+    DB.session.commit()
+    updated_at = team1.updated_at
+    statements = []
+
+    def record_statement(conn, cursor, statement, *args):
+        # pylint: disable=unused-argument
+        statements.append(statement)
+
+    event.listen(DB.engine, "before_cursor_execute", record_statement)
+    try:
+        response = client.patch(
+            f"/teams/{team1.id}",
+            headers={
+                "Accept": "application/vnd.api+json",
+                "Authorization": f"Bearer {create_access_token(identity=user1.id)}",
+                "Content-Type": "application/vnd.api+json",
+            },
+            data=json.dumps({"name": "team1"}),
+        )
+    finally:
+        event.remove(DB.engine, "before_cursor_execute", record_statement)
+    assert response.status_code == 200
+    attributes = json.loads(response.data.decode())["data"]["attributes"]
+    assert attributes["name"] == "team1"
+    assert attributes["updated_at"] == updated_at.isoformat()
+    assert not any(
+        statement.startswith(("UPDATE", "SELECT pg_notify")) for statement in statements
+    )
+
+
 def test_team_detail_delete_without_auth(client):
     """
     WHEN a delete request is made to `/teams/<team_id>` without a token in the `authorization`
@@ -608,3 +655,321 @@ def test_team_detail_delete_success(client, user1, team1):
     assert get_content_type(response) == "application/vnd.api+json"
     assert Team.query.filter_by(id=team1.id).first() is None
     assert len(response.data) == 0
+
+
+def test_team_detail_delete_in_background(app, client, user1, team1):
+    """
+    GIVEN an existing team with more memberships than the background purge threshold, with the
+    authenticated user being a member of that team
+    WHEN a delete request is made to `/teams/<team_id>`
+    THEN the response should have a 204 status code, the team should no longer be retrievable, and
+    the team and its memberships should be removed from the database by the background purge
+    """
+
+    team1.members.append(user1)
+    DB.session.add(team1)
+    DB.session.commit()
+    app.config["PURGE_IN_BACKGROUND_THRESHOLD"] = 0
+    # team1 can't be refreshed once it has been purged
+    team_id = team1.id
+
+    headers = {
+        "Accept": "application/vnd.api+json",
+        "Authorization": f"Bearer {create_access_token(identity=user1.id)}",
+    }
+    response = client.delete(f"/teams/{team_id}", headers=headers)
+    assert response.status_code == 204
+    assert len(response.data) == 0
+    assert client.get(f"/teams/{team_id}", headers=headers).status_code == 404
+
+    app.extensions["purge_executor"].shutdown(wait=True)
+    assert Team.query.filter_by(id=team_id).first() is None
+    assert TeamMembership.query.filter_by(team_id=team_id).count() == 0
+
+
+@pytest.mark.parametrize(
+    "cache_backend", ["memory", "shared_memory", "redis"], indirect=True
+)
+def test_team_detail_get_cached(app, client, user1, team1, cache_backend):
+    """
+    GIVEN an existing team, with the authenticated user being a member of that team
+    WHEN a get request is made to `/teams/<team_id>` after the team has been retrieved once
+    THEN the response should be served from the response cache until the team is patched, after
+    which the response should reflect the patched team, regardless of the cache backend
+    """
+
+    # pylint: disable=unused-argument
+
+    team1.members.append(user1)
+    DB.session.add(team1)
+    DB.session.commit()
+    headers = {
+        "Accept": "application/vnd.api+json",
+        "Authorization": f"Bearer {create_access_token(identity=user1.id)}",
+        "Content-Type": "application/vnd.api+json",
+    }
+
+    response = client.get(f"/teams/{team1.id}", headers=headers)
+    assert json.loads(response.data.decode())["data"]["attributes"]["name"] == "team1"
+
+    # changes made without going through the controllers aren't seen until invalidation
+    DB.session.execute(
+        Team.__table__.update().where(Team.id == team1.id).values(name="renamed")
+    )
+    DB.session.commit()
+    response = client.get(f"/teams/{team1.id}", headers=headers)
+    assert response.status_code == 200
+    assert get_content_type(response) == "application/vnd.api+json"
+    assert json.loads(response.data.decode())["data"]["attributes"]["name"] == "team1"
+
+    response = client.patch(
+        f"/teams/{team1.id}",
+        headers=headers,
+        data=json.dumps({"name": "new team name"}),
+    )
+    assert response.status_code == 200
+    response = client.get(f"/teams/{team1.id}", headers=headers)
+    assert response.status_code == 200
+    assert (
+        json.loads(response.data.decode())["data"]["attributes"]["name"]
+        == "new team name"
+    )
+    stats = app.extensions["response_cache"].stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+def test_team_detail_get_stage_timings(app, client, user1, team1):
+    """
+    GIVEN an existing team
+    WHEN a get request is made to `/teams/<team_id>`
+    THEN the time spent in each stage of handling the request should be recorded, and reported
+    along with the cache and connection pool statistics at `/metrics`
+    """
+
+    # pylint: disable=unused-argument
+
+    response = client.get(
+        f"/teams/{team1.id}",
+        headers={
+            "Accept": "application/vnd.api+json",
+            "Authorization": f"Bearer {create_access_token(identity=user1.id)}",
+        },
+    )
+    assert response.status_code == 200
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert get_content_type(response).startswith("text/plain")
+    metrics = response.data.decode()
+    for stage in ("validate", "auth", "load", "handler", "serialize"):
+        assert (
+            f'request_stage_seconds_count{{endpoint="teamdetail",stage="{stage}"}} 1'
+            in metrics
+        )
+    assert 'cache_misses_total{cache="response_cache"} 1' in metrics
+    pool_stats = dict(
+        line.split(" ") for line in metrics.splitlines() if line.startswith("db_pool_")
+    )
+    assert int(pool_stats['db_pool_checkouts_total{bind="primary"}']) >= 1
+    assert (
+        int(pool_stats['db_pool_size{bind="primary"}'])
+        == app.config["SQLALCHEMY_ENGINE_OPTIONS"]["pool_size"]
+    )
+
+
+def test_team_detail_get_read_only(client, user1, team1):
+    """
+    GIVEN an existing team
+    WHEN a get request is made to `/teams/<team_id>`
+    THEN the request's transaction should be read only, and should have ended, returning its
+    connection to the pool, by the time the response is returned
+    """
+
+    headers = {
+        "Accept": "application/vnd.api+json",
+        "Authorization": f"Bearer {create_access_token(identity=user1.id)}",
+    }
+    team_id = team1.id
+    DB.session.commit()
+    parameters = []
+    event.listen(
+        DB.engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, params, *args: parameters.append(params),
+    )
+
+    response = client.get(f"/teams/{team_id}", headers=headers)
+    assert response.status_code == 200
+    assert "transaction_read_only" in parameters[0].values()
+    assert DB.engine.pool.checkedout() == 0
+
+
+def test_team_detail_get_not_modified(client, user1, user2, team1):
+    """
+    GIVEN an existing team whose details have previously been retrieved
+    WHEN a get request is made to `/teams/<team_id>` with the previous response's ETag in the
+    `If-None-Match` header
+    THEN the response should have a 304 status code and no body while the team is unchanged,
+    answered from the response cache without querying the database, and a 200 status code with a
+    new ETag once a member has been added to the team
+    """
+
+    team_id = team1.id
+    headers = {
+        "Accept": "application/vnd.api+json",
+        "Authorization": f"Bearer {create_access_token(identity=user1.id)}",
+    }
+    response = client.get(f"/teams/{team_id}", headers=headers)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    statements = []
+
+    def record_statement(conn, cursor, statement, *args):
+        # pylint: disable=unused-argument
+        statements.append(statement)
+
+    event.listen(DB.engine, "before_cursor_execute", record_statement)
+    try:
+        response = client.get(
+            f"/teams/{team_id}", headers={**headers, "If-None-Match": etag}
+        )
+    finally:
+        event.remove(DB.engine, "before_cursor_execute", record_statement)
+    assert response.status_code == 304
+    assert not statements
+    assert response.headers["ETag"] == etag
+    assert len(response.data) == 0
+
+    DB.session.add(
+        TeamMembership(
+            user_id=user2.id, team_id=team_id, created_by=user1.id, updated_by=user1.id
+        )
+    )
+    mark_stale("teams", team_id)
+    DB.session.commit()
+    response = client.get(
+        f"/teams/{team_id}", headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_team_detail_get_invalidated_by_other_worker(app, client, user1, team1):
+    """
+    GIVEN an existing team, with the authenticated user being a member of that team, which has been
+    retrieved once and so is in the response cache
+    WHEN the team is patched through another instance of the app, as if by another worker
+    THEN the cached response should be invalidated via the cache invalidation listener, and get
+    requests to `/teams/<team_id>` should reflect the patched team
+    """
+
+    team1.members.append(user1)
+    DB.session.add(team1)
+    DB.session.commit()
+    team_id = team1.id
+    headers = {
+        "Accept": "application/vnd.api+json",
+        "Authorization": f"Bearer {create_access_token(identity=user1.id)}",
+        "Content-Type": "application/vnd.api+json",
+    }
+    response = client.get(f"/teams/{team_id}", headers=headers)
+    assert json.loads(response.data.decode())["data"]["attributes"]["name"] == "team1"
+
+    listener = app.extensions["invalidation_listener"]
+    listener.start()
+    try:
+        other_app = create_app(db_name="marathon_test")
+        other_app.config["CACHE_INVALIDATION_LISTENER"] = False
+
+        def patch_from_other_app():
+            with other_app.test_client() as other_client:
+                response = other_client.patch(
+                    f"/teams/{team_id}",
+                    headers=headers,
+                    data=json.dumps({"name": "new team name"}),
+                )
+                assert response.status_code == 200
+
+        assert listener.listening.wait(5)
+        worker = threading.Thread(target=patch_from_other_app)
+        worker.start()
+        worker.join()
+
+        deadline = time.monotonic() + 5
+        while True:
+            # the test shares its session with the requests it makes, and commits don't expire it
+            DB.session.expire_all()
+            response = client.get(f"/teams/{team_id}", headers=headers)
+            name = json.loads(response.data.decode())["data"]["attributes"]["name"]
+            if name == "new team name" or time.monotonic() > deadline:
+                break
+            time.sleep(0.1)
+        assert name == "new team name"
+    finally:
+        listener.stop()
+        listener.join()
+
+
+def test_team_detail_through_pgbouncer(app, user1, monkeypatch):
+    """
+    GIVEN the app is configured to connect through PgBouncer in transaction pooling mode, with a
+    pool of two server connections
+    WHEN a team is created, retrieved, patched and deleted through `/teams/<team_id>`
+    THEN every request should succeed, with their transactions sharing the pooler's server
+    connections, while migrations run on a direct connection
+    """
+
+    url = make_url(app.config["SQLALCHEMY_DATABASE_URI"])
+    headers = {
+        "Accept": "application/vnd.api+json",
+        "Authorization": f"Bearer {create_access_token(identity=user1.id)}",
+        "Content-Type": "application/vnd.api+json",
+    }
+    monkeypatch.setenv("DB_PGBOUNCER", "true")
+    monkeypatch.setenv("DB_DIRECT_HOST", url.host)
+    monkeypatch.setenv("DB_DIRECT_PORT", str(url.port))
+    with LocalPgBouncer((url.host, url.port), pool_size=2) as pgbouncer:
+        pgbouncer_app = create_app(
+            db_name=url.database, db_host="127.0.0.1", db_port=pgbouncer.port,
+        )
+        pgbouncer_app.config["CACHE_INVALIDATION_LISTENER"] = False
+        with pgbouncer_app.app_context():
+            upgrade()
+        assert pgbouncer.transactions == 0
+        responses = []
+
+        def make_requests():
+            with pgbouncer_app.test_client() as pgbouncer_client:
+                response = pgbouncer_client.post(
+                    "/teams",
+                    headers=headers,
+                    data=json.dumps({"name": "team 1", "team_members": [user1.id]}),
+                )
+                responses.append(response.status_code)
+                team_id = json.loads(response.data.decode())["data"]["id"]
+                responses.append(
+                    pgbouncer_client.get(
+                        f"/teams/{team_id}", headers=headers
+                    ).status_code
+                )
+                response = pgbouncer_client.patch(
+                    f"/teams/{team_id}",
+                    headers=headers,
+                    data=json.dumps({"name": "new team name"}),
+                )
+                responses.append(response.status_code)
+                responses.append(
+                    pgbouncer_client.delete(
+                        f"/teams/{team_id}", headers=headers
+                    ).status_code
+                )
+                DB.session.remove()
+
+        worker = threading.Thread(target=make_requests)
+        worker.start()
+        worker.join()
+        assert responses == [201, 200, 200, 204]
+        assert pgbouncer.server_connections <= 2
+        assert pgbouncer.transactions > len(responses)
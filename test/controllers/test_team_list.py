@@ -3,10 +3,12 @@ import uuid
 
 from flask_jwt_extended import create_access_token
 import pytest
+from sqlalchemy import event
 
 from src.db import DB
 from src.exceptions import BadRequestError
 from src.models import Team
+from src.utils.read_replicas import STICKY_COOKIE
 from .utils import get_content_type
 
 # pylint: disable=invalid-name
@@ -16,6 +18,25 @@ pytestmark = [
 ]
 
 
+def test_team_list_get_errors_in_production_mode(app, client):
+    """
+    GIVEN the app is running with neither debug nor testing mode enabled
+    WHEN get requests are made to `/teams` without a valid `Accept` header, and without a token in
+    the `Authorization` header
+    THEN the responses should have 406 and 401 status codes respectively, rather than 500
+    """
+
+    app.config["TESTING"] = False
+    assert not app.debug
+
+    response = client.get("/teams")
+    assert response.status_code == 406
+    assert get_content_type(response) == "application/vnd.api+json"
+    response = client.get("/teams", headers={"Accept": "application/vnd.api+json"})
+    assert response.status_code == 401
+    assert get_content_type(response) == "application/vnd.api+json"
+
+
 def test_team_list_get_without_auth(client):
     """
     WHEN a get request is made to `/teams` without a token in the `authorization` header
@@ -149,6 +170,174 @@ def test_team_list_get_success(client, user1, team1):
     }
 
 
+def test_team_list_get_with_inactive_member(client, user1, user2, team1):
+    """
+    GIVEN an existing team, one of whose members has been deleted and is awaiting purge
+    WHEN a get request is made to `/teams` with valid authorization
+    THEN the response should have a 200 status code and leave the inactive member, and its team
+    membership, out of the team's relationships and the included resources
+    """
+
+    team1.members.extend([user1, user2])
+    user2.is_active = False
+    DB.session.add_all([team1, user2])
+    DB.session.commit()
+    team_id, user1_id, user2_id = team1.id, user1.id, user2.id
+    DB.session.expire_all()
+
+    response = client.get(
+        "/teams",
+        headers={
+            "Accept": "application/vnd.api+json",
+            "Authorization": f"Bearer {create_access_token(identity=user1_id)}",
+        },
+    )
+
+    assert response.status_code == 200
+    body = json.loads(response.data.decode())
+    relationships = body["data"][0]["relationships"]
+    assert relationships["members"] == {"data": [{"type": "users", "id": user1_id}]}
+    assert len(relationships["team_memberships"]["data"]) == 1
+    assert {"type": "users", "id": user2_id} not in [
+        {"type": resource["type"], "id": resource["id"]}
+        for resource in body["included"]
+    ]
+    assert all(
+        resource["attributes"] == {"user_id": user1_id, "team_id": team_id}
+        for resource in body["included"]
+        if resource["type"] == "team_memberships"
+    )
+
+
+def test_team_list_get_fragments_cached(client, user1, user2, team1, team2):
+    """
+    GIVEN there are existing teams on the platform, which have been listed once
+    WHEN get requests are made to `/teams`, including after a team has been renamed and a user has
+    joined a team
+    THEN the resource objects of the unchanged resources should be served from the fragment cache,
+    while the response reflects both changes
+    """
+
+    team1.members.append(user1)
+    team2.members.append(user2)
+    DB.session.add_all([team1, team2])
+    DB.session.commit()
+    headers = {
+        "Accept": "application/vnd.api+json",
+        "Authorization": f"Bearer {create_access_token(identity=user1.id)}",
+    }
+    cache = client.application.extensions["fragment_cache"]
+
+    first_response = client.get("/teams", headers=headers)
+    assert cache.stats()["misses"] == 6
+    response = client.get("/teams", headers=headers)
+    assert cache.stats()["hits"] == 6
+    assert json.loads(response.data.decode()) == json.loads(
+        first_response.data.decode()
+    )
+
+    DB.session.execute(
+        Team.__table__.update().where(Team.id == team1.id).values(name="renamed")
+    )
+    team2.members.append(user1)
+    DB.session.add(team2)
+    DB.session.commit()
+    # the test shares its session with the requests it makes, and commits don't expire it
+    DB.session.expire_all()
+    response = client.get("/teams", headers=headers)
+    assert response.status_code == 200
+    assert get_content_type(response) == "application/vnd.api+json"
+    teams = {team["id"]: team for team in json.loads(response.data.decode())["data"]}
+    assert teams[team1.id]["attributes"]["name"] == "renamed"
+    assert {"type": "users", "id": user1.id} in teams[team2.id]["relationships"][
+        "members"
+    ]["data"]
+    # only the renamed team and the new membership needed rendering
+    assert cache.stats()["misses"] == 8
+
+
+def test_team_list_get_after_creator_deleted(client, user1, team2):
+    """
+    GIVEN there is an existing team on the platform, which has been listed once
+    WHEN the user who created the team is deleted, and a get request is made to `/teams`
+    THEN the team should no longer reference its creator, rather than being served from the
+    fragment cache as it was before
+    """
+
+    user_id, creator_id = user1.id, team2.created_by
+    headers = {
+        "Accept": "application/vnd.api+json",
+        "Authorization": f"Bearer {create_access_token(identity=user_id)}",
+    }
+    response = client.get("/teams", headers=headers)
+    attributes = json.loads(response.data.decode())["data"][0]["attributes"]
+    assert attributes["created_by"] == creator_id
+
+    response = client.delete(
+        f"/users/{creator_id}",
+        headers={
+            "Accept": "application/vnd.api+json",
+            "Authorization": f"Bearer {create_access_token(identity=creator_id)}",
+        },
+    )
+    assert response.status_code == 204
+    response = client.get("/teams", headers=headers)
+    assert response.status_code == 200
+    attributes = json.loads(response.data.decode())["data"][0]["attributes"]
+    assert attributes["created_by"] is None
+    assert attributes["updated_by"] is None
+
+
+def test_team_list_get_read_replica(app, client, user1, team1):
+    """
+    GIVEN a read replica has been configured
+    WHEN get requests are made to `/teams` before and just after a team is created
+    THEN the first get request should read from the replica, while the post request and the get
+    request following it should read from the primary
+    """
+
+    # pylint: disable=unused-argument
+
+    # user1 is expired once each get request ends its read only transaction
+    user_id = user1.id
+    # the replica is simply another connection to the test database
+    app.config["SQLALCHEMY_BINDS"] = {
+        "replica_0": app.config["SQLALCHEMY_DATABASE_URI"]
+    }
+    app.config["READ_REPLICA_BINDS"] = ["replica_0"]
+    replica = DB.get_engine(app, bind="replica_0")
+    replica_statements = []
+    event.listen(
+        replica,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: replica_statements.append(statement),
+    )
+    headers = {
+        "Accept": "application/vnd.api+json",
+        "Authorization": f"Bearer {create_access_token(identity=user_id)}",
+        "Content-Type": "application/vnd.api+json",
+    }
+
+    response = client.get("/teams", headers=headers)
+    assert response.status_code == 200
+    assert replica_statements
+
+    replica_statements.clear()
+    response = client.post(
+        "/teams",
+        data=json.dumps({"name": "team 2", "team_members": [user_id]}),
+        headers=headers,
+    )
+    assert response.status_code == 201
+    assert STICKY_COOKIE in response.headers["Set-Cookie"]
+    response = client.get("/teams", headers=headers)
+    assert response.status_code == 200
+    assert len(json.loads(response.data.decode())["data"]) == 2
+    assert not replica_statements
+    DB.session.close()
+    replica.dispose()
+
+
 def test_team_list_post_without_auth(client, user1):
     """
     WHEN a post request is made to `/teams` without a token in the `authorization` header
@@ -279,7 +468,12 @@ def test_team_list_post_missing_parameters(client, user1):
     assert response.status_code == 400
     assert get_content_type(response) == "application/vnd.api+json"
     assert json.loads(response.data.decode()) == dict(
-        message=dict(team_members="Missing required parameter in the JSON body")
+        errors=[
+            BadRequestError(
+                "Missing required parameter in the JSON body",
+                source={"pointer": "/team_members"},
+            ).to_dict()
+        ]
     )
 
 
@@ -302,7 +496,12 @@ def test_team_list_post_no_team_members(client, user1):
     assert response.status_code == 400
     assert get_content_type(response) == "application/vnd.api+json"
     assert json.loads(response.data.decode()) == dict(
-        message=dict(team_members="Missing required parameter in the JSON body")
+        errors=[
+            BadRequestError(
+                "Missing required parameter in the JSON body",
+                source={"pointer": "/team_members"},
+            ).to_dict()
+        ]
     )
 
 
@@ -388,3 +587,47 @@ def test_team_list_post_success(client, user1):
             },
         ],
     }
+
+
+def test_team_list_post_without_reloading(client, user1):
+    """
+    WHEN a post request is made to `/teams` with valid parameters
+    THEN the new team and its membership should be inserted with their generated columns returned,
+    and the response should be serialized without any further queries
+    """
+
+    statements = []
+
+    def record_statement(conn, cursor, statement, *args):
+        # pylint: disable=unused-argument
+        statements.append(statement)
+
+    user_id = user1.id
+    event.listen(DB.engine, "before_cursor_execute", record_statement)
+    try:
+        response = client.post(
+            "/teams",
+            data=json.dumps({"name": "team 1", "team_members": [user_id]}),
+            headers={
+                "Accept": "application/vnd.api+json",
+                "Authorization": f"Bearer {create_access_token(identity=user_id)}",
+                "Content-Type": "application/vnd.api+json",
+            },
+        )
+    finally:
+        event.remove(DB.engine, "before_cursor_execute", record_statement)
+    assert response.status_code == 201
+    data = json.loads(response.data.decode())["data"]
+    assert data["relationships"]["members"]["data"] == [
+        {"type": "users", "id": user_id}
+    ]
+    inserts = [
+        i for i, statement in enumerate(statements) if statement.startswith("INSERT")
+    ]
+    assert len(inserts) == 2
+    assert all("RETURNING" in statements[i] for i in inserts)
+    # cache invalidations are the only thing selected once the team has been inserted
+    assert all(
+        statement.startswith("SELECT pg_notify") or not statement.startswith("SELECT")
+        for statement in statements[inserts[0] :]
+    )
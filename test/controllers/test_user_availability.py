@@ -0,0 +1,134 @@
+import json
+
+import pytest
+
+from src.app import create_app
+from src.exceptions import BadRequestError, TooManyRequestsError
+from .utils import get_content_type
+
+# pylint: disable=invalid-name
+pytestmark = [
+    pytest.mark.integration,
+    pytest.mark.controllers,
+]
+
+
+def test_user_availability_get_invalid_accept_header(client):
+    """
+    WHEN a get request is made to `/users/availability` and the `ACCEPT` header is not correctly
+    set
+    THEN the response should have a 406 status code and indicate that the `ACCEPT` header is not
+    correctly set
+    """
+
+    response = client.get("/users/availability?username=username")
+    assert response.status_code == 406
+    assert get_content_type(response) == "application/vnd.api+json"
+    assert json.loads(response.data.decode()) == {
+        "errors": [
+            {
+                "status": 406,
+                "title": "Not Acceptable",
+                "detail": "'Accept' header must be set to 'application/vnd.api+json'",
+            }
+        ]
+    }
+
+
+def test_user_availability_get_missing_parameters(client):
+    """
+    WHEN a get request is made to `/users/availability` without a username or email
+    THEN the response should have a 400 status code and indicate that one of them is required
+    """
+
+    response = client.get(
+        "/users/availability", headers={"Accept": "application/vnd.api+json"}
+    )
+    assert response.status_code == 400
+    assert get_content_type(response) == "application/vnd.api+json"
+    assert json.loads(response.data.decode()) == dict(
+        errors=[
+            BadRequestError(
+                "At least one of the query parameters 'username' or 'email' must be provided"
+            ).to_dict()
+        ]
+    )
+
+
+def test_user_availability_get_success(client, user1):
+    """
+    GIVEN a pre-existing user
+    WHEN a get request is made to `/users/availability` with that user's username and an unused
+    email
+    THEN the response should have a 200 status code and indicate that only the email is available
+    """
+
+    response = client.get(
+        f"/users/availability?username={user1.username}&email=new@email.com",
+        headers={"Accept": "application/vnd.api+json"},
+    )
+    assert response.status_code == 200
+    assert get_content_type(response) == "application/vnd.api+json"
+    assert json.loads(response.data.decode()) == {
+        "links": {
+            "self": (
+                f"http://localhost/users/availability?username={user1.username}"
+                "&email=new%40email.com"
+            )
+        },
+        "meta": {"available": {"username": False, "email": True}},
+    }
+
+
+def test_user_availability_get_rate_limited(app, client):
+    """
+    WHEN more get requests are made to `/users/availability` from one client than the rate limit
+    allows
+    THEN the response should have a 429 status code and indicate that too many requests were made
+    """
+
+    app.config["RATE_LIMITS"]["availability"] = (2, 60)
+    for _ in range(2):
+        response = client.get(
+            "/users/availability?username=username",
+            headers={"Accept": "application/vnd.api+json"},
+        )
+        assert response.status_code == 200
+
+    response = client.get(
+        "/users/availability?username=username",
+        headers={"Accept": "application/vnd.api+json"},
+    )
+    assert response.status_code == 429
+    assert get_content_type(response) == "application/vnd.api+json"
+    assert json.loads(response.data.decode()) == dict(
+        errors=[TooManyRequestsError().to_dict()]
+    )
+
+
+def test_user_availability_get_rate_limited_behind_proxy(app, monkeypatch):
+    """
+    GIVEN the app is configured to trust the reverse proxy in front of it
+    WHEN more get requests are made to `/users/availability` from one client than the rate limit
+    allows, followed by a request from another client, all through the proxy
+    THEN the client's requests beyond the limit should have a 429 status code, while the other
+    client's request should succeed
+    """
+
+    # pylint: disable=unused-argument
+    monkeypatch.setenv("TRUSTED_PROXY_COUNT", "1")
+    proxied_app = create_app(db_name="marathon_test")
+    proxied_app.config["CACHE_INVALIDATION_LISTENER"] = False
+    proxied_app.config["RATE_LIMITS"]["availability"] = (1, 60)
+
+    with proxied_app.test_client() as client:
+        statuses = [
+            client.get(
+                "/users/availability?username=username",
+                headers={"Accept": "application/vnd.api+json", "X-Forwarded-For": ip},
+                environ_base={"REMOTE_ADDR": "10.0.0.1"},
+            ).status_code
+            for ip in ["203.0.113.1", "203.0.113.1", "203.0.113.2"]
+        ]
+
+    assert statuses == [200, 429, 200]
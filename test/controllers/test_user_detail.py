@@ -1,12 +1,14 @@
 import json
+import sqlite3
 import uuid
 
-from flask_jwt_extended import create_access_token
+from flask_jwt_extended import create_access_token, create_refresh_token
 import pytest
 
 from src.db import DB
 from src.exceptions import BadRequestError, ForbiddenError, NotFoundError
 from src.models import TeamMembership, User
+from src.utils.invalidation import mark_stale
 from .utils import get_content_type
 
 # pylint: disable=invalid-name
@@ -49,7 +51,7 @@ def test_user_detail_get_without_auth(client):
     """
 
     response = client.get(
-        "/users/abcdefg", headers={"Accept": "application/vnd.api+json"},
+        f"/users/{uuid.uuid4()}", headers={"Accept": "application/vnd.api+json"},
     )
     assert response.status_code == 401
     assert get_content_type(response) == "application/vnd.api+json"
@@ -64,6 +66,24 @@ def test_user_detail_get_without_auth(client):
     }
 
 
+def test_user_detail_get_non_uuid_without_auth(client):
+    """
+    WHEN a get request is made to `/users/<user_id>` without a token in the `authorization` header,
+    but the user ID is not a valid UUID
+    THEN the request should be rejected while it is routed, so the response should have a 400
+    status and indicate that the provided user ID is not a valid UUID
+    """
+
+    response = client.get(
+        "/users/abcdefg", headers={"Accept": "application/vnd.api+json"}
+    )
+    assert response.status_code == 400
+    assert get_content_type(response) == "application/vnd.api+json"
+    assert json.loads(response.data.decode()) == dict(
+        errors=[BadRequestError("User ID abcdefg is not a valid UUID").to_dict()]
+    )
+
+
 def test_user_detail_get_with_invalid_auth(client):
     """
     WHEN a get request is made to `/users/<user_id>` with an invalid token in the `authorization`
@@ -73,7 +93,7 @@ def test_user_detail_get_with_invalid_auth(client):
     """
 
     response = client.get(
-        "/users/abcdefg",
+        f"/users/{uuid.uuid4()}",
         headers={"Accept": "application/vnd.api+json", "Authorization": "abcdefg"},
     )
     assert response.status_code == 422
@@ -131,6 +151,45 @@ def test_user_detail_get_nonexistent(client, user1):
     )
 
 
+def test_user_detail_get_nonexistent_cached(client, user1):
+    """
+    WHEN get requests are made to `/users/<user_id>` but no user with the given ID exists
+    THEN the ID should be remembered as missing, so that the responses have a 404 status even if a
+    user with that ID is inserted behind the controllers' backs, until the user is marked as stale
+    """
+
+    user_id = str(uuid.uuid4())
+    headers = {
+        "Accept": "application/vnd.api+json",
+        "Authorization": f"Bearer {create_access_token(identity=user1.id)}",
+    }
+    response = client.get(f"/users/{user_id}", headers=headers)
+    assert response.status_code == 404
+
+    DB.session.add(
+        User(
+            id=user_id,
+            first_name="First",
+            last_name="Last",
+            username="missing",
+            email="missing@email.com",
+            password="password",
+        )
+    )
+    DB.session.commit()
+    response = client.get(f"/users/{user_id}", headers=headers)
+    assert response.status_code == 404
+    assert get_content_type(response) == "application/vnd.api+json"
+    assert json.loads(response.data.decode()) == dict(
+        errors=[NotFoundError(f"No User exists with the ID {user_id}").to_dict()]
+    )
+
+    mark_stale("users", user_id)
+    DB.session.commit()
+    response = client.get(f"/users/{user_id}", headers=headers)
+    assert response.status_code == 200
+
+
 def test_user_detail_get_success(client, user1, team1):
     """
     GIVEN an existing user on the platform
@@ -278,7 +337,7 @@ def test_user_detail_patch_without_auth(client):
     """
 
     response = client.patch(
-        "/users/abcdefg",
+        f"/users/{uuid.uuid4()}",
         data=json.dumps({"first_name": "updated_first"}),
         headers={
             "Accept": "application/vnd.api+json",
@@ -307,7 +366,7 @@ def test_user_detail_patch_with_invalid_auth(client):
     """
 
     response = client.patch(
-        "/users/abcdefg",
+        f"/users/{uuid.uuid4()}",
         data=json.dumps({"first_name": "updated_first"}),
         headers={
             "Accept": "application/vnd.api+json",
@@ -401,6 +460,37 @@ def test_user_detail_patch_different_user(client, user1, user2):
     )
 
 
+def test_user_detail_patch_invalid_attributes(client, user1):
+    """
+    GIVEN an existing user on the platform
+    WHEN a patch request is made to `/users/<user_id>` with attributes which are null or aren't
+    strings
+    THEN the response should have a 400 status code and point at each invalid attribute, and the
+    user should be unchanged
+    """
+
+    response = client.patch(
+        f"/users/{user1.id}",
+        data=json.dumps({"first_name": None, "email": ["me@email.com"]}),
+        headers={
+            "Accept": "application/vnd.api+json",
+            "Authorization": f"Bearer {create_access_token(identity=user1.id)}",
+            "Content-Type": "application/vnd.api+json",
+        },
+    )
+    assert response.status_code == 400
+    assert get_content_type(response) == "application/vnd.api+json"
+    assert json.loads(response.data.decode()) == dict(
+        errors=[
+            BadRequestError(
+                "Must not be null", source={"pointer": "/first_name"}
+            ).to_dict(),
+            BadRequestError("Must be a string", source={"pointer": "/email"}).to_dict(),
+        ]
+    )
+    assert User.query.filter_by(id=user1.id).first().first_name == "First"
+
+
 def test_user_detail_patch_success(client, user1):
     """
     GIVEN an existing user on the platform
@@ -440,6 +530,81 @@ def test_user_detail_patch_success(client, user1):
     }
 
 
+def test_user_detail_patch_unchanged(client, user1):
+    """
+    GIVEN an existing user on the platform
+    WHEN a patch request is made to `/users/<user_id>` with all of the user's current details,
+    including their password
+    THEN the response should have a 200 status code and return the user's details, without the
+    user being updated or their password being hashed again
+    """
+
+    updated_at, password_hash = user1.updated_at, user1.password_hash
+
+    response = client.patch(
+        f"/users/{user1.id}",
+        data=json.dumps(
+            {
+                "first_name": user1.first_name,
+                "last_name": user1.last_name,
+                "username": user1.username,
+                "email": user1.email,
+                "password": "password",
+            }
+        ),
+        headers={
+            "Accept": "application/vnd.api+json",
+            "Authorization": f"Bearer {create_access_token(identity=user1.id)}",
+            "Content-Type": "application/vnd.api+json",
+        },
+    )
+    assert response.status_code == 200
+    attributes = json.loads(response.data.decode())["data"]["attributes"]
+    assert attributes["updated_at"] == updated_at.isoformat()
+    DB.session.expire_all()
+    user = User.query.filter_by(id=user1.id).first()
+    assert user.updated_at == updated_at
+    # bcrypt salts every hash, so hashing the password again would have changed it
+    assert user.password_hash == password_hash
+
+
+@pytest.mark.parametrize("cache_backend", ["shared_memory"], indirect=True)
+def test_user_detail_shared_cache_locked(
+    app, client, user1, cache_backend, monkeypatch
+):
+    """
+    GIVEN an existing user on the platform, and the shared memory caches' databases being locked
+    WHEN get and patch requests are made to `/users/<user_id>` with the user's ID
+    THEN the requests should succeed as if the caches were empty
+    """
+
+    # pylint: disable=unused-argument
+
+    def locked():
+        raise sqlite3.OperationalError("database is locked")
+
+    user_id = user1.id
+    headers = {
+        "Accept": "application/vnd.api+json",
+        "Authorization": f"Bearer {create_access_token(identity=user_id)}",
+        "Content-Type": "application/vnd.api+json",
+    }
+    for name in app.extensions:
+        if name.endswith("_cache"):
+            monkeypatch.setattr(app.extensions[name], "_connect", locked)
+
+    for _ in range(2):
+        response = client.get(f"/users/{user_id}", headers=headers)
+        assert response.status_code == 200
+    response = client.patch(
+        f"/users/{user_id}", headers=headers, data=json.dumps({"first_name": "renamed"})
+    )
+    assert response.status_code == 200
+    response = client.get(f"/users/{user_id}", headers=headers)
+    data = json.loads(response.data.decode())["data"]
+    assert data["attributes"]["first_name"] == "renamed"
+
+
 def test_user_detail_delete_invalid_accept_header(client, user1):
     """
     WHEN a delete request is made to `/users/<user_id>` and the `ACCEPT` header is not correctly set
@@ -597,3 +762,170 @@ def test_user_detail_delete_success(client, user1):
     assert get_content_type(response) == "application/vnd.api+json"
     assert User.query.filter_by(id=user1.id).first() is None
     assert len(response.data) == 0
+
+
+def test_user_detail_delete_in_background(app, client, user1, team1):
+    """
+    GIVEN an existing user with more team memberships than the background purge threshold
+    WHEN a delete request is made to `/users/<user_id>` with the user's ID
+    THEN the response should have a 204 status code, the user should no longer be retrievable, and
+    the user and their memberships should be removed from the database by the background purge
+    """
+
+    team1.members.append(user1)
+    DB.session.add(team1)
+    DB.session.commit()
+    app.config["PURGE_IN_BACKGROUND_THRESHOLD"] = 0
+    # user1 can't be refreshed once they have been purged
+    user_id = user1.id
+
+    headers = {
+        "Accept": "application/vnd.api+json",
+        "Authorization": f"Bearer {create_access_token(identity=user_id)}",
+    }
+    response = client.delete(f"/users/{user_id}", headers=headers)
+    assert response.status_code == 204
+    assert len(response.data) == 0
+    assert client.get(f"/users/{user_id}", headers=headers).status_code == 404
+
+    app.extensions["purge_executor"].shutdown(wait=True)
+    assert User.query.filter_by(id=user_id).first() is None
+    assert TeamMembership.query.filter_by(user_id=user_id).count() == 0
+
+
+def test_user_detail_delete_evicts_created_memberships(client, user1, user2, team1):
+    """
+    GIVEN an existing team, with the authenticated user being a member of that team through a
+    membership created by a user who isn't a member, and whose details have been cached
+    WHEN a delete request is made to `/users/<user_id>` with the ID of the membership's creator
+    THEN get requests to `/teams/<team_id>` should no longer show the membership referencing its
+    creator, rather than being served from the response cache
+    """
+
+    team_id, user_id, creator_id = team1.id, user1.id, user2.id
+    DB.session.add(
+        TeamMembership(
+            user_id=user_id,
+            team_id=team_id,
+            created_by=creator_id,
+            updated_by=creator_id,
+        )
+    )
+    DB.session.commit()
+    headers = {
+        "Accept": "application/vnd.api+json",
+        "Authorization": f"Bearer {create_access_token(identity=user_id)}",
+    }
+    response = client.get(f"/teams/{team_id}", headers=headers)
+    membership = json.loads(response.data.decode())["included"][0]
+    assert membership["attributes"]["created_by"] == creator_id
+
+    response = client.delete(
+        f"/users/{creator_id}",
+        headers={
+            "Accept": "application/vnd.api+json",
+            "Authorization": f"Bearer {create_access_token(identity=creator_id)}",
+        },
+    )
+    assert response.status_code == 204
+    response = client.get(f"/teams/{team_id}", headers=headers)
+    assert response.status_code == 200
+    membership = json.loads(response.data.decode())["included"][0]
+    assert membership["type"] == "team_memberships"
+    assert membership["attributes"]["created_by"] is None
+    assert membership["attributes"]["updated_by"] is None
+
+
+def test_user_detail_delete_changes_created_team_etags(app, client, user1, team2):
+    """
+    GIVEN an existing team whose details have previously been retrieved
+    WHEN a delete request is made to `/users/<user_id>` with the ID of the team's creator
+    THEN get requests to `/teams/<team_id>` with the previous response's ETag in the
+    `If-None-Match` header should have a 200 status code with a new ETag, even if the response
+    isn't cached
+    """
+
+    team_id, creator_id = team2.id, team2.created_by
+    headers = {
+        "Accept": "application/vnd.api+json",
+        "Authorization": f"Bearer {create_access_token(identity=user1.id)}",
+    }
+    response = client.get(f"/teams/{team_id}", headers=headers)
+    etag = response.headers["ETag"]
+
+    response = client.delete(
+        f"/users/{creator_id}",
+        headers={
+            "Accept": "application/vnd.api+json",
+            "Authorization": f"Bearer {create_access_token(identity=creator_id)}",
+        },
+    )
+    assert response.status_code == 204
+    app.extensions["response_cache"].clear()
+    response = client.get(
+        f"/teams/{team_id}", headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    attributes = json.loads(response.data.decode())["data"]["attributes"]
+    assert attributes["created_by"] is None
+
+
+def test_user_detail_delete_evicts_cached_user(client, user1):
+    """
+    GIVEN an existing user on the platform, whose details have been cached by an authenticated
+    request
+    WHEN a delete request is made to `/users/<user_id>` with the user's ID
+    THEN the user's cached details should be evicted, so their refresh token is rejected
+    """
+
+    refresh_token = create_refresh_token(identity=user1.id)
+    response = client.post(
+        "/auth/refresh", headers={"Authorization": f"Bearer {refresh_token}"}
+    )
+    assert response.status_code == 200
+
+    response = client.delete(
+        f"/users/{user1.id}",
+        headers={
+            "Accept": "application/vnd.api+json",
+            "Authorization": f"Bearer {create_access_token(identity=user1.id)}",
+        },
+    )
+    assert response.status_code == 204
+
+    response = client.post(
+        "/auth/refresh", headers={"Authorization": f"Bearer {refresh_token}"}
+    )
+    assert response.status_code == 401
+
+
+def test_user_detail_get_cache_invalidated_by_relationship_change(client, user1, team1):
+    """
+    GIVEN an existing user and team, with the user's details having been retrieved once
+    WHEN the user is added to the team via `/users/<user_id>/relationships/teams`
+    THEN a subsequent get request to `/users/<user_id>` should include the team
+    """
+
+    headers = {
+        "Accept": "application/vnd.api+json",
+        "Authorization": f"Bearer {create_access_token(identity=user1.id)}",
+        "Content-Type": "application/vnd.api+json",
+    }
+    response = client.get(f"/users/{user1.id}", headers=headers)
+    assert json.loads(response.data.decode())["data"]["relationships"]["teams"] == {
+        "data": []
+    }
+
+    response = client.post(
+        f"/users/{user1.id}/relationships/teams",
+        headers=headers,
+        data=json.dumps({"data": [{"type": "teams", "id": team1.id}]}),
+    )
+    assert response.status_code == 201
+
+    response = client.get(f"/users/{user1.id}", headers=headers)
+    assert response.status_code == 200
+    assert json.loads(response.data.decode())["data"]["relationships"]["teams"] == {
+        "data": [{"type": "teams", "id": team1.id}]
+    }
@@ -4,8 +4,9 @@ from flask_jwt_extended import create_access_token
 import pytest
 
 from src.db import DB
-from src.exceptions import ConflictError
+from src.exceptions import BadRequestError, ConflictError, GatewayTimeoutError
 from src.models import User
+from src.utils.query_budgets import QueryBudget
 from .utils import get_content_type
 
 # pylint: disable=invalid-name
@@ -148,6 +149,39 @@ def test_user_list_get_success(client, user1, team1):
     }
 
 
+def test_user_list_get_statement_timeout(app, client, user1):
+    """
+    GIVEN the users table is locked by another transaction
+    WHEN a get request is made to `/users`
+    THEN the request's queries should be cancelled once they exceed the collection query budget,
+    and the response should have a 504 status code
+    """
+
+    app.config["QUERY_BUDGETS"]["collection"] = QueryBudget(
+        statement_timeout=100, idle_in_transaction_timeout=1000
+    )
+    headers = {
+        "Accept": "application/vnd.api+json",
+        "Authorization": f"Bearer {create_access_token(identity=user1.id)}",
+    }
+    # end the transaction begun by loading user1, which would otherwise block the lock below
+    DB.session.commit()
+
+    with DB.engine.connect() as connection:
+        transaction = connection.begin()
+        connection.execute("LOCK TABLE users IN ACCESS EXCLUSIVE MODE")
+        response = client.get("/users", headers=headers)
+        transaction.rollback()
+    assert response.status_code == 504
+    assert get_content_type(response) == "application/vnd.api+json"
+    assert json.loads(response.data.decode()) == {
+        "errors": [GatewayTimeoutError().to_dict()]
+    }
+
+    response = client.get("/users", headers=headers)
+    assert response.status_code == 200
+
+
 def test_user_list_post_invalid_accept_header(client):
     """
     WHEN a post request is made to `/users` and the `ACCEPT` header is not correctly set
@@ -231,7 +265,12 @@ def test_user_list_post_missing_parameters(client):
     assert response.status_code == 400
     assert get_content_type(response) == "application/vnd.api+json"
     assert json.loads(response.data.decode()) == dict(
-        message=dict(password="Missing required parameter in the JSON body")
+        errors=[
+            BadRequestError(
+                "Missing required parameter in the JSON body",
+                source={"pointer": "/password"},
+            ).to_dict()
+        ]
     )
 
 
@@ -40,6 +40,33 @@ def test_user_relationship_teams_post_without_auth(client, user1, team1):
     }
 
 
+def test_user_relationship_teams_post_without_auth_or_body(client, user1):
+    """
+    WHEN a post request is made to `/users/<user_id>/relationships/teams` without a token in the
+    `Authorization` header or a request body
+    THEN the response should have a 401 status code and indicate that the header is missing
+    """
+
+    response = client.post(
+        f"/users/{user1.id}/relationships/teams",
+        headers={
+            "Accept": "application/vnd.api+json",
+            "Content-Type": "application/vnd.api+json",
+        },
+    )
+    assert response.status_code == 401
+    assert get_content_type(response) == "application/vnd.api+json"
+    assert json.loads(response.data.decode()) == {
+        "errors": [
+            {
+                "status": 401,
+                "title": "Unauthorized",
+                "detail": "Missing Authorization Header",
+            }
+        ]
+    }
+
+
 def test_user_relationship_teams_post_with_invalid_auth(client, user1, team1):
     """
     WHEN a post request is made to `/users/<user_id>/relationships/teams` with an invalid token in
@@ -224,6 +251,8 @@ def test_user_relationship_teams_post_other_user(client, user1, team1):
     [
         ([{"type": "teams", "id": str(uuid4())}],),
         ({"data": {"type": "teams", "id": str(uuid4())}}),
+        (None),
+        ("data"),
     ],
 )
 def test_user_relationship_teams_post_incorrect_structure(client, user1, req_body):
@@ -486,6 +515,33 @@ def test_user_relationship_teams_delete_without_auth(client, user1, team1):
     }
 
 
+def test_user_relationship_teams_delete_without_auth_or_body(client, user1):
+    """
+    WHEN a delete request is made to `/users/<user_id>/relationships/teams` without a token in the
+    `Authorization` header or a request body
+    THEN the response should have a 401 status code and indicate that the header is missing
+    """
+
+    response = client.delete(
+        f"/users/{user1.id}/relationships/teams",
+        headers={
+            "Accept": "application/vnd.api+json",
+            "Content-Type": "application/vnd.api+json",
+        },
+    )
+    assert response.status_code == 401
+    assert get_content_type(response) == "application/vnd.api+json"
+    assert json.loads(response.data.decode()) == {
+        "errors": [
+            {
+                "status": 401,
+                "title": "Unauthorized",
+                "detail": "Missing Authorization Header",
+            }
+        ]
+    }
+
+
 def test_user_relationship_teams_delete_with_invalid_auth(client, user1, team1):
     """
     WHEN a delete request is made to `/users/<user_id>/relationships/teams` with an invalid token in
@@ -672,6 +728,8 @@ def test_user_relationship_teams_delete_other_user(client, user1, team1):
     [
         ([{"type": "teams", "id": str(uuid4())}],),
         ({"data": {"type": "teams", "id": str(uuid4())}}),
+        (None),
+        ("data"),
     ],
 )
 def test_user_relationship_teams_delete_incorrect_structure(client, user1, req_body):
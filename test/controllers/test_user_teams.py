@@ -5,7 +5,7 @@ from flask_jwt_extended import create_access_token
 import pytest
 
 from src.db import DB
-from src.models import TeamMembership
+from src.models import TeamMembership, User
 from .utils import get_content_type
 
 # pylint: disable=invalid-name
@@ -196,3 +196,79 @@ def test_user_teams_get_success(client, user1, team1):
             },
         ],
     }
+
+
+def test_user_teams_get_not_modified(client, user1, team1):
+    """
+    GIVEN an existing user who is a member of a team, and whose teams have previously been
+    retrieved
+    WHEN a get request is made to `/users/<user_id>/teams` with the previous response's ETag in the
+    `If-None-Match` header
+    THEN the response should have a 304 status code while the user's teams are unchanged, and a 200
+    status code once one of them has been renamed
+    """
+
+    team1.members.append(user1)
+    DB.session.add(team1)
+    DB.session.commit()
+    headers = {
+        "Accept": "application/vnd.api+json",
+        "Authorization": f"Bearer {create_access_token(identity=user1.id)}",
+    }
+    response = client.get(f"/users/{user1.id}/teams", headers=headers)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    response = client.get(
+        f"/users/{user1.id}/teams", headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert len(response.data) == 0
+
+    team1.name = "renamed"
+    DB.session.add(team1)
+    DB.session.commit()
+    response = client.get(
+        f"/users/{user1.id}/teams", headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert json.loads(response.data.decode())["data"][0]["attributes"]["name"] == (
+        "renamed"
+    )
+
+
+def test_user_teams_get_with_inactive_member(client, user1, user2, team1):
+    """
+    GIVEN an existing user who is a member of a team, and whose teams have previously been
+    retrieved
+    WHEN another member of the team is deleted, and is awaiting purge, and a get request is made to
+    `/users/<user_id>/teams` with the previous response's ETag in the `If-None-Match` header
+    THEN the response should have a 200 status code and leave the inactive member out of the team's
+    members
+    """
+
+    team1.members.extend([user1, user2])
+    DB.session.add(team1)
+    DB.session.commit()
+    user1_id, user2_id = user1.id, user2.id
+    headers = {
+        "Accept": "application/vnd.api+json",
+        "Authorization": f"Bearer {create_access_token(identity=user1_id)}",
+    }
+    response = client.get(f"/users/{user1_id}/teams", headers=headers)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    DB.session.execute(
+        User.__table__.update().where(User.id == user2_id).values(is_active=False)
+    )
+    DB.session.commit()
+    DB.session.expire_all()
+    response = client.get(
+        f"/users/{user1_id}/teams", headers={**headers, "If-None-Match": etag}
+    )
+
+    assert response.status_code == 200
+    assert json.loads(response.data.decode())["data"][0]["relationships"]["members"][
+        "data"
+    ] == [{"type": "users", "id": user1_id}]
@@ -1,2 +1,296 @@
+import fnmatch
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+
 def get_content_type(response):
     return next(x for x in response.headers if x[0] == "Content-Type")[1]
+
+
+class LocalRedisServer(socketserver.ThreadingTCPServer):
+    """
+    A stand-in for a Redis server, implementing just the commands used by the redis cache backend,
+    for use as a context manager.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _RedisRequestHandler)
+        self.data = {}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"redis://127.0.0.1:{self.server_address[1]}/0"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+    def execute(self, name, *args):
+        # pylint: disable=too-many-return-statements
+        with self.lock:
+            now = time.monotonic()
+            for key in [k for k, (_, e) in self.data.items() if e and e <= now]:
+                del self.data[key]
+            if name == b"GET":
+                return self.data.get(args[0], (None,))[0]
+            if name == b"MGET":
+                return [self.data.get(key, (None,))[0] for key in args]
+            if name == b"SET":
+                expires_at = now + int(args[3]) / 1000 if len(args) > 2 else None
+                self.data[args[0]] = (args[1], expires_at)
+                return "OK"
+            if name == b"DEL":
+                return sum(self.data.pop(key, None) is not None for key in args)
+            if name == b"SCAN":
+                pattern = args[args.index(b"MATCH") + 1].decode()
+                return [
+                    b"0",
+                    [k for k in self.data if fnmatch.fnmatchcase(k.decode(), pattern)],
+                ]
+            if name == b"INFO":
+                return b"# Stats\r\nevicted_keys:0\r\n"
+            if name in (b"PING", b"SELECT", b"AUTH"):
+                return "OK"
+            return ValueError(f"unknown command '{name.decode()}'")
+
+
+class _RedisRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = []
+            for _ in range(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                command.append(self.rfile.read(length + 2)[:-2])
+            self.wfile.write(_encode_reply(self.server.execute(*command)))
+
+
+def _encode_reply(reply):
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, str):
+        return f"+{reply}\r\n".encode()
+    if isinstance(reply, Exception):
+        return f"-ERR {reply}\r\n".encode()
+    if isinstance(reply, int):
+        return f":{reply}\r\n".encode()
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+    return b"*%d\r\n" % len(reply) + b"".join(_encode_reply(item) for item in reply)
+
+
+class LocalPgBouncer(socketserver.ThreadingTCPServer):
+    """
+    A stand-in for PgBouncer in transaction pooling mode, for use as a context manager. Clients'
+    transactions are multiplexed over at most `pool_size` connections to the Postgres server at
+    `upstream`, with a client only holding a server connection from the start of a transaction
+    until the server is idle again.
+
+    Server connections are opened while greeting new clients (which authenticate them), until
+    there are `pool_size` of them; later clients are greeted by the stand-in itself. Every client
+    must therefore connect as the same user to the same database. Only the simple query protocol,
+    which psycopg2 uses, is supported.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, upstream, pool_size=2):
+        super().__init__(("127.0.0.1", 0), _PgBouncerRequestHandler)
+        self.upstream = upstream
+        self.pool_size = pool_size
+        self.server_connections = 0
+        self.transactions = 0
+        self._idle = []
+        self._parameters = []
+        self._condition = threading.Condition()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+        with self._condition:
+            for server in self._idle:
+                server.close()
+
+    def greet(self, startup, client_rfile, client_wfile):
+        with self._condition:
+            opening = self.server_connections < self.pool_size
+            if opening:
+                self.server_connections += 1
+        if not opening:
+            client_wfile.write(
+                _encode_message(b"R", struct.pack("!I", 0))
+                + b"".join(_encode_message(*message) for message in self._parameters)
+                + _encode_message(b"K", struct.pack("!II", 0, 0))
+                + _encode_message(b"Z", b"I")
+            )
+            return
+        try:
+            server = _PgServerConnection(self.upstream)
+            self._parameters = server.authenticate(startup, client_rfile, client_wfile)
+        except BaseException:
+            self.discard(None)
+            raise
+        self.release(server)
+
+    def acquire(self):
+        with self._condition:
+            while not self._idle:
+                self._condition.wait()
+            self.transactions += 1
+            return self._idle.pop()
+
+    def release(self, server):
+        with self._condition:
+            self._idle.append(server)
+            self._condition.notify()
+
+    def discard(self, server):
+        if server is not None:
+            server.close()
+        with self._condition:
+            self.server_connections -= 1
+
+
+class _PgServerConnection:
+    # authentication requests which the client must respond to (cleartext, MD5 and SASL)
+    _CHALLENGES = (3, 5, 10, 11)
+
+    def __init__(self, address):
+        self.socket = socket.create_connection(address)
+        self.rfile = self.socket.makefile("rb")
+
+    def authenticate(self, startup, client_rfile, client_wfile):
+        """
+        Relays the client's startup to the server, returning the server's parameter statuses.
+        """
+
+        self.socket.sendall(startup)
+        parameters = []
+        while True:
+            message_type, body = self.read()
+            client_wfile.write(_encode_message(message_type, body))
+            if message_type == b"S":
+                parameters.append((message_type, body))
+            elif message_type == b"E":
+                raise ConnectionError("The server rejected the connection")
+            elif message_type == b"R" and struct.unpack("!I", body[:4])[0] in (
+                self._CHALLENGES
+            ):
+                self.send(*_read_message(client_rfile))
+            elif message_type == b"Z":
+                return parameters
+
+    def send(self, message_type, body):
+        self.socket.sendall(_encode_message(message_type, body))
+
+    def read(self):
+        message = _read_message(self.rfile)
+        if message is None:
+            raise ConnectionError("The server closed the connection")
+        return message
+
+    def close(self):
+        self.rfile.close()
+        self.socket.close()
+
+
+class _PgBouncerRequestHandler(socketserver.StreamRequestHandler):
+    # the request codes of SSL and GSSAPI encryption requests, and of cancel requests
+    _ENCRYPTION_REQUESTS = (80877103, 80877104)
+    _CANCEL_REQUEST = 80877102
+
+    def handle(self):
+        startup = self._read_startup()
+        if startup is None:
+            return
+        self.server.greet(startup, self.rfile, self.wfile)
+        connection = self._relay()
+        if connection is not None:
+            # the client left mid-transaction, so its transaction must not leak to others
+            connection.send(b"Q", b"ROLLBACK\x00")
+            while connection.read()[0] != b"Z":
+                pass
+            self.server.release(connection)
+
+    def _relay(self):
+        """
+        Relays the client's messages to a server connection, which is only held for the duration of
+        a transaction. Returns the connection if the client leaves in the middle of one.
+        """
+
+        connection = None
+        try:
+            while True:
+                message = _read_message(self.rfile)
+                if message is None or message[0] == b"X":
+                    return connection
+                if connection is None:
+                    connection = self.server.acquire()
+                connection.send(*message)
+                if (
+                    message[0] in (b"Q", b"S")
+                    and self._relay_replies(connection) == b"I"
+                ):
+                    self.server.release(connection)
+                    connection = None
+        except ConnectionError:
+            if connection is not None:
+                self.server.discard(connection)
+            return None
+
+    def _relay_replies(self, connection):
+        """
+        Relays the server's replies up to and including its next ReadyForQuery message, returning
+        the transaction status it reports (b"I" when idle, outside of a transaction).
+        """
+
+        while True:
+            message_type, body = connection.read()
+            self.wfile.write(_encode_message(message_type, body))
+            if message_type == b"Z":
+                return body
+
+    def _read_startup(self):
+        while True:
+            header = self.rfile.read(8)
+            if len(header) < 8:
+                return None
+            length, code = struct.unpack("!II", header)
+            body = self.rfile.read(length - 8)
+            if code == self._CANCEL_REQUEST:
+                return None
+            if code not in self._ENCRYPTION_REQUESTS:
+                return header + body
+            self.wfile.write(b"N")
+
+
+def _read_message(rfile):
+    message_type = rfile.read(1)
+    if not message_type:
+        return None
+    (length,) = struct.unpack("!I", rfile.read(4))
+    return message_type, rfile.read(length - 4)
+
+
+def _encode_message(message_type, body):
+    return message_type + struct.pack("!I", len(body) + 4) + body